@@ -1,19 +1,43 @@
-from http.client import HTTPResponse
+"""
+A client for the Curricular Analytics website. See `docs/ca-api.md`.
+
+Connections are kept alive and reused between requests, and a `Session` can be
+shared between threads. Idempotent requests, like GETs, that fail because of a
+network error or a server error are retried with exponential backoff. Other
+requests aren't, because the server may have handled the request before it
+failed; instead, `upload_curriculum` and `upload_degree_plan` check whether
+the upload went through before trying again.
+
+Exports:
+    `Session`, which makes requests on behalf of a Curricular Analytics user.
+"""
+
+from http.client import (
+    HTTPConnection,
+    HTTPException,
+    HTTPMessage,
+    HTTPSConnection,
+    RemoteDisconnected,
+)
+from html import unescape
 import json
 import re
+from threading import Lock
+import time
 from typing import (
     Any,
+    Callable,
     Dict,
     List,
     Literal,
     NamedTuple,
     Optional,
+    Set,
     Tuple,
     Union,
 )
 from urllib.error import HTTPError
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from urllib.parse import urlencode, urljoin, urlsplit
 
 from output_json import (
     Curriculum,
@@ -28,14 +52,30 @@ CsvFile = Tuple[str, str]
 FormData = Dict[str, Union[str, Tuple[str, bytes]]]
 
 
-class UrlOpenReturn(HTTPResponse):
+class Response(NamedTuple):
     """
-    HACK: Mimic urllib.request.urlopen's return type. Their docs say they return
-    a `HTTPResponse`, but that doesn't have a `url` attribute, and I don't know
-    how to do intersections in Python typing.
+    A response whose body has already been read, so its connection can be
+    reused. Redirects aren't followed, so `location` is where the server
+    redirected to, if anywhere.
+
+    Like the response `urllib.request.urlopen` returns, it can be used in a
+    `with` statement and read with `read()`.
     """
 
-    url: str
+    status: int
+    reason: str
+    headers: HTTPMessage
+    body: bytes
+    location: Optional[str]
+
+    def read(self) -> bytes:
+        return self.body
+
+    def __enter__(self) -> "Response":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
 
 
 class Blob(bytearray):
@@ -49,6 +89,56 @@ class Blob(bytearray):
 
 HOST = "https://curricularanalytics.org"
 
+# Rate limiting and server errors, which are worth trying again
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Requests that can be sent again without changing the result, even if the
+# server handled the first one
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class ConnectionPool:
+    """
+    Keeps idle keep-alive connections to a host so they can be reused. A
+    connection is only used by one request at a time, so a pool can be shared
+    between threads.
+    """
+
+    _scheme: str
+    _netloc: str
+    _timeout: float
+    _idle: List[HTTPConnection]
+    _lock: Lock
+
+    def __init__(self, host: str, timeout: float = 60) -> None:
+        url = urlsplit(host)
+        self._scheme = url.scheme
+        self._netloc = url.netloc
+        self._timeout = timeout
+        self._idle = []
+        self._lock = Lock()
+
+    def get(self, reuse: bool = True) -> Tuple[HTTPConnection, bool]:
+        """
+        Returns an idle connection, or a new one if there are none or `reuse`
+        is false, and whether the connection has been used before.
+        """
+        with self._lock:
+            if reuse and self._idle:
+                return self._idle.pop(), True
+        if self._scheme == "https":
+            return HTTPSConnection(self._netloc, timeout=self._timeout), False
+        return HTTPConnection(self._netloc, timeout=self._timeout), False
+
+    def put(self, connection: HTTPConnection) -> None:
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle.clear()
+
 
 class CurriculumEntry(NamedTuple):
     """
@@ -73,19 +163,96 @@ class CurriculumEntry(NamedTuple):
             )
         return int(match.group(1))
 
+    def name(self) -> str:
+        """
+        Get the name of the curriculum from the "Name" column (`raw_name`).
+        """
+        match = re.match(r"<a [^>]*>(.*)</a>", self.raw_name, re.DOTALL)
+        if match is None:
+            raise ValueError(
+                f"The name of the curriculum entry `{self.raw_name}` doesn't seem to be a link."
+            )
+        return unescape(match.group(1))
+
 
 class Session:
     session: str
     # Same as CSRF token, as it turns out
     authenticity_token: Optional[str]
+    host: str
+    retries: int
+    backoff: float
+    _pool: ConnectionPool
 
-    def __init__(self, session: str, authenticity_token: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        session: str,
+        authenticity_token: Optional[str] = None,
+        host: str = HOST,
+        retries: int = 3,
+        backoff: float = 1,
+    ) -> None:
         """
         `authenticity_token` is optional because it can get one by itself, but
         you can help save a request by providing your own.
+
+        `host` can be changed to point the session at a local stand-in for
+        Curricular Analytics. A failed request is tried again up to `retries`
+        times, waiting `backoff` seconds before the first retry and twice as
+        long before each retry after that.
         """
         self.session = session
         self.authenticity_token = authenticity_token
+        self.host = host
+        self.retries = retries
+        self.backoff = backoff
+        self._pool = ConnectionPool(host)
+
+    def _send(
+        self,
+        path: str,
+        headers: Dict[str, str],
+        data: Optional[bytes],
+        method: str,
+        idempotent: bool,
+    ) -> Response:
+        """
+        An idle connection may have been closed by the server, which only shows
+        up once a request is sent on it. Idempotent requests can just be sent
+        again on a new connection, but other requests get a new connection from
+        the start so they're only ever sent once.
+        """
+        headers = {
+            **headers,
+            "Cookie": f"_curricularanalytics_session={self.session}",
+        }
+        while True:
+            connection, reused = self._pool.get(reuse=idempotent)
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                # The server closed an idle connection, so try a new one
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._pool.put(connection)
+            location = response.getheader("Location")
+            return Response(
+                response.status,
+                response.reason,
+                response.msg,
+                body,
+                urljoin(self.host + path, location) if location else None,
+            )
 
     def request(
         self,
@@ -93,31 +260,40 @@ class Session:
         headers: Dict[str, str] = {},
         data: Optional[bytes] = None,
         method: str = "GET",
-    ) -> UrlOpenReturn:
-        try:
-            return urlopen(
-                Request(
-                    HOST + path,
-                    headers={
-                        **headers,
-                        "Cookie": f"_curricularanalytics_session={self.session}",
-                    },
-                    data=data,
-                    method=method,
-                )
-            )
-        except HTTPError as error:
-            raise (
-                RuntimeError(
-                    "Curricular Analytics isn't recognizing your `CA_SESSION` environment variable. Could you try getting the session cookie again? See the README for how."
-                )
-                if error.code == 401
-                else error
-            )
+    ) -> Response:
+        """
+        Only idempotent requests (see `IDEMPOTENT_METHODS`) are retried.
+        """
+        idempotent = method in IDEMPOTENT_METHODS
+        retries = self.retries if idempotent else 0
+        attempt = 0
+        while True:
+            try:
+                response = self._send(path, headers, data, method, idempotent)
+            except (OSError, HTTPException):
+                if attempt >= retries:
+                    raise
+            else:
+                if response.status == 401:
+                    raise RuntimeError(
+                        "Curricular Analytics isn't recognizing your `CA_SESSION` environment variable. Could you try getting the session cookie again? See the README for how."
+                    )
+                if response.status < 400:
+                    return response
+                if response.status not in RETRY_STATUSES or attempt >= retries:
+                    raise HTTPError(
+                        self.host + path,
+                        response.status,
+                        response.reason,
+                        response.headers,
+                        None,
+                    )
+            time.sleep(self.backoff * 2**attempt)
+            attempt += 1
 
     def get_json(self, path: str) -> Any:
         with self.request(path, {"Accept": "application/json"}) as response:
-            return json.load(response)
+            return json.loads(response.body)
 
     def get_auth_token(self) -> str:
         if self.authenticity_token is None:
@@ -192,11 +368,34 @@ class Session:
                 "POST",
             )
         with request as response:
-            if response.url == HOST + "/users/sign_in":
+            if response.location == self.host + "/users/sign_in":
                 raise RuntimeError(
                     "Curricular Analytics isn't recognizing your `CA_SESSION` environment variable. Could you try getting the session cookie again? See the README for how."
                 )
 
+    def _create(self, post: Callable[[], None], find: Callable[[], Set[int]]) -> None:
+        """
+        Creates something with `post`, which isn't retried by `request` because
+        a request that seems to fail, such as by timing out, may have created it
+        anyway. Before trying again, this checks whether `find`, which lists the
+        IDs of matching records, has a new ID since before the first try.
+        """
+        existing = find()
+        attempt = 0
+        while True:
+            try:
+                post()
+                return
+            except (OSError, HTTPException) as error:
+                if attempt >= self.retries or (
+                    isinstance(error, HTTPError) and error.code not in RETRY_STATUSES
+                ):
+                    raise
+            time.sleep(self.backoff * 2**attempt)
+            attempt += 1
+            if find() - existing:
+                return
+
     def upload_curriculum(
         self,
         organization_id: int,
@@ -206,7 +405,8 @@ class Session:
         cip_code: str = "",
     ) -> None:
         """
-        Creates a new curriculum under the given organization.
+        Creates a new curriculum under the given organization. If the upload
+        fails, it's only tried again if the curriculum wasn't created.
         """
         form: FormData
         if isinstance(data, tuple):
@@ -220,23 +420,25 @@ class Session:
                 "entry_method": "gui",
                 "curriculum_json": json.dumps(data),
             }
-        self.post_form(
-            "/curricula",
-            {
-                "authenticity_token": self.get_auth_token(),
-                "curriculum[name]": name,
-                "curriculum[organization_id]": str(organization_id),
-                "curriculum[catalog_year]": str(year),
-                "curriculum[cip]": cip_code,  # Curricular Analytics will get it from the CSV
-                **form,
-            },
+        form = {
+            "authenticity_token": self.get_auth_token(),
+            "curriculum[name]": name,
+            "curriculum[organization_id]": str(organization_id),
+            "curriculum[catalog_year]": str(year),
+            "curriculum[cip]": cip_code,  # Curricular Analytics will get it from the CSV
+            **form,
+        }
+        self._create(
+            lambda: self.post_form("/curricula", form),
+            lambda: self._curriculum_ids(name),
         )
 
     def upload_degree_plan(
         self, curriculum_id: int, name: str, data: Union[CsvFile, Curriculum]
     ) -> None:
         """
-        Creates a new degree plan under the given curriculum.
+        Creates a new degree plan under the given curriculum. If the upload
+        fails, it's only tried again if the degree plan wasn't created.
         """
         form: FormData
         if isinstance(data, tuple):
@@ -250,13 +452,18 @@ class Session:
                 "entry_method": "gui",
                 "curriculum_json": json.dumps(data),
             }
-        self.post_form(
-            "/degree_plans",
-            {
-                "authenticity_token": self.get_auth_token(),
-                "degree_plan[name]": name,
-                "degree_plan[curriculum_id]": str(curriculum_id),
-                **form,
+        form = {
+            "authenticity_token": self.get_auth_token(),
+            "degree_plan[name]": name,
+            "degree_plan[curriculum_id]": str(curriculum_id),
+            **form,
+        }
+        self._create(
+            lambda: self.post_form("/degree_plans", form),
+            lambda: {
+                plan_id
+                for plan_name, plan_id in self.get_degree_plans(curriculum_id).items()
+                if unescape(plan_name) == name
             },
         )
 
@@ -272,8 +479,8 @@ class Session:
         Get the user's curricula on Curricular Analytics. This is equivalent to the
         table the user sees at https://curricularanalytics.org/curricula.
 
-        Used by `upload_major` to get the ID of the most recently created
-        curriculum.
+        Used by `find_curriculum` to get the ID of the most recently created
+        curriculum with a name.
 
         `sort_by` should be the index of the column to sort by, and `direction` is
         whether it should be sorted in ascending (`asc`) or descending (`desc`)
@@ -304,6 +511,24 @@ class Session:
             for raw_name, raw_organization, cip_code, year, date_created, _ in data
         ]
 
+    def _curriculum_ids(self, name: str) -> Set[int]:
+        return {
+            entry.curriculum_id()
+            for entry in self.get_curricula(4, direction="desc", items=10, search=name)
+            if entry.name() == name
+        }
+
+    def find_curriculum(self, name: str) -> int:
+        """
+        Get the ID of the most recently created curriculum with the given name.
+        Unlike taking the most recently created curriculum, this still works
+        when other curricula are being uploaded at the same time.
+        """
+        for entry in self.get_curricula(4, direction="desc", items=10, search=name):
+            if entry.name() == name:
+                return entry.curriculum_id()
+        raise KeyError(f"There is no curriculum named {repr(name)}.")
+
     def get_degree_plans(self, curriculum_id: int) -> Dict[str, int]:
         with self.request(f"/curricula/{curriculum_id}/graph") as response:
             return {
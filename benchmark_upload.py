@@ -0,0 +1,107 @@
+"""
+Measures how quickly `upload.py` uploads a whole year of majors, using the
+local stand-in server in `fake_ca.py` so nothing is uploaded to
+curricularanalytics.org.
+
+For each number of jobs, every major with plans that year is uploaded to a
+fresh fake server, and the end-to-end time and requests per second are
+reported. The uploaded curriculum IDs are tracked in a temporary file, so
+`files/uploaded<year>.yml` is left alone.
+
+python3 benchmark_upload.py 2023
+python3 benchmark_upload.py 2023 --jobs 1 4 8 --latency 0.2 --error-rate 0.05
+"""
+
+import os
+from tempfile import TemporaryDirectory
+import time
+from typing import List, NamedTuple
+
+from fake_ca import FakeServer
+from parse import major_codes, major_plans
+from upload import MajorUploader, upload_majors
+
+
+class BenchmarkResult(NamedTuple):
+    jobs: int
+    seconds: float
+    requests: int
+    majors: int
+    failed: List[str]
+
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds if self.seconds > 0 else 0
+
+
+def benchmark(
+    year: int,
+    jobs: int,
+    latency: float = 0,
+    error_rate: float = 0,
+    use_json: bool = False,
+) -> BenchmarkResult:
+    majors = [
+        major_codes()[major_code]
+        for major_code in major_plans(year).keys()
+        if major_code in major_codes()
+    ]
+    with FakeServer(latency=latency, error_rate=error_rate) as server:
+        os.environ["CA_HOST"] = server.host
+        os.environ.setdefault("CA_SESSION", "benchmark")
+        uploader = MajorUploader()
+        # Keep retries from dominating the measurement
+        uploader.backoff = 0.01
+        with TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            failed = upload_majors(
+                uploader,
+                majors,
+                1,
+                year,
+                "XX",
+                jobs,
+                use_json,
+                path=os.path.join(directory, f"uploaded{year}.yml"),
+            )
+            seconds = time.perf_counter() - start
+        return BenchmarkResult(
+            jobs, seconds, server.state.requests, len(majors), failed
+        )
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="Measure upload throughput against a local fake Curricular Analytics server."
+    )
+    parser.add_argument("year", type=int, help="The plan year to upload.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=[1, 4],
+        help="Numbers of majors to upload at a time to compare. Default: 1 4",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.1,
+        help="Seconds the fake server waits before each response. Default: 0.1",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests the fake server fails with a 503. Default: 0",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Upload by JSON rather than CSV files."
+    )
+    args = parser.parse_args()
+    for jobs in args.jobs:
+        result = benchmark(args.year, jobs, args.latency, args.error_rate, args.json)
+        print(
+            f"{result.jobs} jobs: {result.majors} majors in {result.seconds:.2f}s, {result.requests} requests ({result.requests_per_second():.1f}/s)"
+            + (f", failed {' '.join(result.failed)}" if result.failed else "")
+        )
@@ -0,0 +1,269 @@
+"""
+Compact binary sidecars for the split prereq and plan CSV files. `split_csv.py`
+writes a `.bin` file next to each `.csv` it creates, and `parse.py` reads the
+sidecar instead of the CSV when the sidecar is newer.
+
+A sidecar stores every distinct string once in a string table, and each CSV
+column is stored as a flat array of either string table indices or numbers, so
+the file can be memory-mapped and read without parsing CSV.
+
+Exports:
+    `write_prereqs` and `write_plans`, which convert a split CSV file into a
+    sidecar.
+
+    `read_table`, which memory-maps a sidecar and returns its `Table`.
+
+    `sidecar_path` and `is_fresh`, for finding a CSV file's sidecar and
+    checking whether it can be used.
+"""
+
+from array import array
+import csv
+from contextlib import contextmanager
+import mmap
+import os
+import struct
+from typing import Dict, Generator, List, Literal, NamedTuple, Sequence, Tuple, Union
+
+__all__ = [
+    "PREREQS_MAGIC",
+    "PLANS_MAGIC",
+    "PREREQ_COLUMNS",
+    "PLAN_COLUMNS",
+    "write_prereqs",
+    "write_plans",
+    "read_table",
+    "sidecar_path",
+    "is_fresh",
+]
+
+PREREQS_MAGIC = b"CAPR0001"
+PLANS_MAGIC = b"CAPL0001"
+
+# Magic, string count, row count, column count
+_HEADER = struct.Struct("<8sIII")
+
+Typecode = Literal["i", "d"]
+Column = Union["memoryview[int]", "memoryview[float]"]
+
+PREREQ_COLUMNS: Tuple[Typecode, ...] = ("i", "i", "i", "i", "i", "i")
+"""
+Subject, number, prereq sequence ID (0 if none), prereq subject, prereq number,
+allow concurrent
+"""
+PLAN_COLUMNS: Tuple[Typecode, ...] = ("i", "i", "i", "i", "d", "i", "i", "i", "i", "i")
+"""
+Department, major, college, course title, units, course type, GE/major overlap,
+start year, year taken, quarter taken
+"""
+
+
+def sidecar_path(csv_path: str) -> str:
+    return csv_path.removesuffix(".csv") + ".bin"
+
+
+def is_fresh(csv_path: str) -> bool:
+    """
+    Whether the CSV file has a sidecar that was written after the CSV file was
+    last modified. Raises `FileNotFoundError` if the CSV file doesn't exist.
+    """
+    csv_mtime = os.stat(csv_path).st_mtime_ns
+    try:
+        return os.stat(sidecar_path(csv_path)).st_mtime_ns >= csv_mtime
+    except FileNotFoundError:
+        return False
+
+
+class _Interner:
+    strings: List[str]
+    _indices: Dict[str, int]
+
+    def __init__(self) -> None:
+        self.strings = []
+        self._indices = {}
+
+    def __call__(self, string: str) -> int:
+        index = self._indices.get(string)
+        if index is None:
+            index = self._indices[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+
+def _pad(file_size: int) -> bytes:
+    # Keep every column 8-byte aligned so it can be cast in place
+    return b"\0" * (-file_size % 8)
+
+
+def _write_table(
+    path: str,
+    magic: bytes,
+    strings: List[str],
+    columns: Sequence[Union["array[int]", "array[float]"]],
+) -> None:
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = array("I", [0])
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+    # Write to a temporary file first so a half-written sidecar is never read
+    with open(path + ".tmp", "wb") as file:
+        size = file.write(
+            _HEADER.pack(magic, len(strings), len(columns[0]), len(columns))
+        )
+        size += file.write(offsets.tobytes())
+        size += file.write(b"".join(encoded))
+        for column in columns:
+            size += file.write(_pad(size))
+            size += file.write(column.tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def write_prereqs(csv_path: str) -> None:
+    """
+    Converts a split prereq CSV file (see `parse.prereq_rows_to_dict`) into a
+    sidecar.
+    """
+    intern = _Interner()
+    columns: List["array[int]"] = [array("i") for _ in PREREQ_COLUMNS]
+    with open(csv_path, newline="") as file:
+        for (
+            _,  # Term Code
+            _,  # Term ID
+            _,  # Course ID
+            subject,  # Course Subject Code
+            number,  # Course Number
+            req_id,  # Prereq Sequence ID
+            _,  # Prereq Course ID
+            req_subj,  # Prereq Subject Code
+            req_num,  # Prereq Course Number
+            _,  # Prereq Minimum Grade Priority
+            _,  # Prereq Minimum Grade
+            allow_concurrent,  # Allow concurrent registration
+        ) in csv.reader(file):
+            for column, value in zip(
+                columns,
+                (
+                    intern(subject.strip()),
+                    intern(number.strip()),
+                    int(req_id) if req_id else 0,
+                    intern(req_subj.strip()),
+                    intern(req_num.strip()),
+                    allow_concurrent == "Y",
+                ),
+            ):
+                column.append(value)
+    _write_table(sidecar_path(csv_path), PREREQS_MAGIC, intern.strings, columns)
+
+
+def write_plans(csv_path: str) -> None:
+    """
+    Converts a split academic plan CSV file (see `parse.plan_rows_to_dict`) into
+    a sidecar.
+    """
+    intern = _Interner()
+    # Units are the only float column
+    int_columns: List["array[int]"] = [array("i") for _ in range(9)]
+    units_column: "array[float]" = array("d")
+    with open(csv_path, newline="") as file:
+        for (
+            department,  # Department
+            major_code,  # Major
+            college_code,  # College
+            course_title,  # Course
+            units,  # Units
+            course_type,  # Course Type
+            overlap,  # GE/Major Overlap
+            year,  # Start Year
+            plan_yr,  # Year Taken
+            plan_qtr,  # Quarter Taken
+            *_,  # Term Taken, Plan Length
+        ) in csv.reader(file):
+            units_column.append(float(units))
+            for column, value in zip(
+                int_columns,
+                (
+                    intern(department),
+                    intern(major_code),
+                    intern(college_code),
+                    intern(course_title),
+                    intern(course_type),
+                    overlap == "Y",
+                    int(year),
+                    int(plan_yr),
+                    int(plan_qtr),
+                ),
+            ):
+                column.append(value)
+    _write_table(
+        sidecar_path(csv_path),
+        PLANS_MAGIC,
+        intern.strings,
+        [*int_columns[:4], units_column, *int_columns[4:]],
+    )
+
+
+class Table(NamedTuple):
+    """
+    A memory-mapped sidecar. `columns` are views into the mapped file, so they
+    are only valid inside `read_table`'s `with` block.
+    """
+
+    strings: List[str]
+    row_count: int
+    columns: List[Column]
+
+
+@contextmanager
+def read_table(
+    csv_path: str, magic: bytes, typecodes: Sequence[Typecode]
+) -> Generator[Table, None, None]:
+    """
+    Memory-maps the sidecar of a CSV file. Raises `ValueError` if the sidecar
+    is not of the expected kind or is truncated, e.g. if it was written by an
+    older version of this module.
+
+    ```py
+    with read_table(path, PREREQS_MAGIC, PREREQ_COLUMNS) as table:
+        ...
+    ```
+    """
+    with open(sidecar_path(csv_path), "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            views: List[Column] = []
+            try:
+                try:
+                    file_magic, string_count, row_count, column_count = (
+                        _HEADER.unpack_from(view)
+                    )
+                except struct.error:
+                    raise ValueError(f"{sidecar_path(csv_path)} is truncated")
+                if file_magic != magic or column_count != len(typecodes):
+                    raise ValueError(f"{sidecar_path(csv_path)} is not a {magic!r}")
+                offset = _HEADER.size
+                if offset + (string_count + 1) * 4 > len(view):
+                    raise ValueError(f"{sidecar_path(csv_path)} is truncated")
+                offsets = view[offset : offset + (string_count + 1) * 4].cast("I")
+                views.append(offsets)
+                offset += (string_count + 1) * 4
+                if offset + offsets[-1] > len(view):
+                    raise ValueError(f"{sidecar_path(csv_path)} is truncated")
+                blob = bytes(view[offset : offset + offsets[-1]])
+                strings = [
+                    blob[start:end].decode("utf-8")
+                    for start, end in zip(offsets, offsets[1:])
+                ]
+                offset += offsets[-1]
+                for typecode in typecodes:
+                    offset += len(_pad(offset))
+                    size = row_count * struct.calcsize(typecode)
+                    if offset + size > len(view):
+                        raise ValueError(f"{sidecar_path(csv_path)} is truncated")
+                    views.append(view[offset : offset + size].cast(typecode))
+                    offset += size
+                yield Table(strings, row_count, views[1:])
+            finally:
+                # The map can't be closed while views into it still exist
+                for column in views:
+                    column.release()
+                view.release()
@@ -1,6 +1,7 @@
 from typing import Dict, Tuple
 from parse import prereqs
 from parse_defs import CourseCode
+from prereq_graph import prereq_graph
 
 THRESHOLD = 0.5
 
@@ -20,12 +21,8 @@ def parse_int(string: str) -> Tuple[int, str]:
 
 
 def main() -> None:
-    course_codes = set(prereqs("FA21").keys()) | {
-        prerequisite.course_code
-        for requirements in prereqs("FA21").values()
-        for alternatives in requirements
-        for prerequisite in alternatives
-    }
+    # Courses offered in FA21 and courses they require
+    course_codes = set(prereq_graph("FA21").codes)
     subjects = sorted({subject for subject, _ in course_codes})
 
     for subject in subjects:
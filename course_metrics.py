@@ -2,10 +2,9 @@
 python3 course_metrics.py
 """
 
-from curricularanalytics import Course
-
+from metrics import course_metrics, plan_graph
 from output import MajorOutput
-from parse import major_plans
+from parse import load_all_plans
 from util import CsvWriter, float_str
 
 HEADER = [
@@ -25,28 +24,22 @@ def main() -> None:
         writer = CsvWriter(len(HEADER), file)
         writer.row(*HEADER)
 
-        for year in range(2015, 2050):
-            majors = major_plans(year)
-            if majors == {}:
-                break
+        for year, majors in load_all_plans().by_year():
             for major, plans in majors.items():
-                degree_plan = MajorOutput(plans).output_degree_plan()
-                curriculum = degree_plan.curriculum
-                for course in curriculum.courses:
-                    assert isinstance(course, Course)
-                    if course.prefix == "":
+                graph = plan_graph(MajorOutput(plans))
+                metrics = course_metrics(graph.adjacency)
+                for i, course in enumerate(graph.courses):
+                    if course.course_code.subject == "":
                         continue
                     writer.row(
                         str(year),  # Year
                         major,  # Major
-                        f"{course.prefix} {course.num}",  # Course
-                        float_str(curriculum.complexity(course)),  # Complexity
-                        str(curriculum.centrality(course)),  # Centrality
-                        str(degree_plan.find_term(course)),  # Year taken in plan
-                        float_str(
-                            curriculum.blocking_factor(course)
-                        ),  # Blocking factor
-                        float_str(curriculum.delay_factor(course)),  # Delay factor
+                        str(course.course_code),  # Course
+                        float_str(metrics.complexity[i]),  # Complexity
+                        str(metrics.centrality[i]),  # Centrality
+                        str(course.term),  # Year taken in plan
+                        float_str(metrics.blocking_factor[i]),  # Blocking factor
+                        float_str(metrics.delay_factor[i]),  # Delay factor
                     )
 
 
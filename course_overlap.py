@@ -1,8 +1,30 @@
 """
+Lists the fraction of each major's courses that are also in every other major,
+for every year of plans.
+
+Each year's curricula are encoded as a boolean major × course matrix, so the
+number of courses every pair of majors has in common comes from a single
+matrix product rather than a set intersection per pair.
+
+By default, every ordered pair of majors gets a row in
+`files/course_overlap_py.csv`, even if the majors have nothing in common.
+`--sparse` leaves out pairs with no overlap, and `--min-overlap` leaves out
+pairs below a fraction. `--format parquet` (which needs pyarrow) and
+`--format npz` write a binary file instead of a CSV. The npz file has the whole
+count matrices, so it can't leave out pairs.
+
 python3 course_overlap.py
+python3 course_overlap.py --sparse --min-overlap 0.25
+python3 course_overlap.py --format npz --output files/course_overlap_py.npz
 """
 
-from parse import major_plans
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from parse import load_all_plans, major_plans
+from parse_defs import ProcessedCourse
 from util import CsvWriter
 
 HEADER = [
@@ -13,38 +35,174 @@ HEADER = [
 ]
 
 
-def print_year(writer: CsvWriter, year: int) -> None:
+class YearOverlap(NamedTuple):
+    """
+    `counts[i, j]` is the number of courses in `majors[i]`'s curriculum that
+    are also in `majors[j]`'s, so `counts[i, i]` is the size of `majors[i]`'s
+    curriculum.
+    """
+
+    year: int
+    majors: List[str]
+    counts: NDArray[np.int64]
+
+    def fractions(self) -> NDArray[np.float64]:
+        """
+        The fraction of the base major's courses that are in the other major,
+        or 0 if the base major has no courses.
+        """
+        sizes = np.diagonal(self.counts)[:, None]
+        return np.divide(
+            self.counts,
+            sizes,
+            out=np.zeros(self.counts.shape, dtype=np.float64),
+            where=sizes > 0,
+        )
+
+    def pairs(
+        self, sparse: bool = False, min_overlap: Optional[float] = None
+    ) -> Iterator[Tuple[str, str, float]]:
+        """
+        Yields `(base, other, fraction)` for every ordered pair of majors, in
+        order of base major then other major. `sparse` skips pairs with no
+        overlap, and `min_overlap` skips pairs with a smaller fraction.
+        """
+        fractions = self.fractions()
+        keep = np.ones(fractions.shape, dtype=np.bool_)
+        if sparse:
+            keep &= self.counts > 0
+        if min_overlap is not None:
+            keep &= fractions >= min_overlap
+        for base, other in zip(*np.nonzero(keep)):
+            yield self.majors[base], self.majors[other], float(fractions[base, other])
+
+
+def year_overlap(year: int) -> Optional[YearOverlap]:
     majors = major_plans(year)
     if majors == {}:
-        return
+        return None
 
-    curricula = {
-        major: {course for course in plans.curriculum() if course.for_major}
-        for major, plans in majors.items()
-    }
     major_codes = sorted(majors.keys())
-    for base in major_codes:
-        for other in major_codes:
-            writer.row(
-                str(year),
-                base,
-                other,
-                str(
-                    len(curricula[base] & curricula[other]) / len(curricula[base])
-                    if curricula[base]
-                    else 0
-                ),
-            )
-
-
-def main() -> None:
-    with open("./files/course_overlap_py.csv", "w") as file:
+    # Courses are compared as whole `ProcessedCourse`s, not just by code
+    course_ids: Dict[ProcessedCourse, int] = {}
+    rows: List[List[int]] = []
+    for major in major_codes:
+        rows.append(
+            [
+                course_ids.setdefault(course, len(course_ids))
+                for course in majors[major].curriculum()
+                if course.for_major
+            ]
+        )
+    # float32 matrix products go through BLAS, and course counts are well
+    # within the range of integers it represents exactly
+    matrix = np.zeros((len(major_codes), len(course_ids)), dtype=np.float32)
+    for i, row in enumerate(rows):
+        matrix[i, row] = 1
+    counts = (matrix @ matrix.T).astype(np.int64)
+    return YearOverlap(year, major_codes, counts)
+
+
+def all_overlaps() -> Iterator[YearOverlap]:
+    for year in load_all_plans().years():
+        overlap = year_overlap(year)
+        if overlap is not None:
+            yield overlap
+
+
+def write_csv(
+    path: str,
+    overlaps: Iterator[YearOverlap],
+    sparse: bool = False,
+    min_overlap: Optional[float] = None,
+) -> None:
+    with open(path, "w") as file:
         writer = CsvWriter(len(HEADER), file)
         writer.row(*HEADER)
+        for overlap in overlaps:
+            empty = {
+                major
+                for major, size in zip(overlap.majors, np.diagonal(overlap.counts))
+                if size == 0
+            }
+            for base, other, fraction in overlap.pairs(sparse, min_overlap):
+                writer.row(
+                    str(overlap.year),
+                    base,
+                    other,
+                    str(0 if base in empty else fraction),
+                )
+
 
-        for year in range(2015, 2050):
-            print_year(writer, year)
+def write_parquet(
+    path: str,
+    overlaps: Iterator[YearOverlap],
+    sparse: bool = False,
+    min_overlap: Optional[float] = None,
+) -> None:
+    import pandas as pd  # type: ignore
+
+    rows = [
+        (overlap.year, base, other, fraction)
+        for overlap in overlaps
+        for base, other, fraction in overlap.pairs(sparse, min_overlap)
+    ]
+    pd.DataFrame(rows, columns=HEADER).to_parquet(path, index=False)  # type: ignore
+
+
+def write_npz(path: str, overlaps: Iterator[YearOverlap]) -> None:
+    """
+    Saves each year's major codes and overlap counts as `majors_<year>` and
+    `counts_<year>`. The whole count matrices are saved, so there's nothing to
+    leave out.
+    """
+    arrays: Dict[str, NDArray[np.generic]] = {}
+    for overlap in overlaps:
+        arrays[f"majors_{overlap.year}"] = np.array(overlap.majors)
+        arrays[f"counts_{overlap.year}"] = overlap.counts
+    np.savez_compressed(path, allow_pickle=False, **arrays)
 
 
 if __name__ == "__main__":
-    main()
+    from argparse import ArgumentParser
+    from importlib.util import find_spec
+
+    parser = ArgumentParser(
+        description="List the fraction of each major's courses that are also in every other major."
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet", "npz"],
+        default="csv",
+        help="Output format. Parquet needs pyarrow. Default: csv",
+    )
+    parser.add_argument(
+        "--output",
+        help="Path to write to. Default: files/course_overlap_py.<format>",
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Leave out pairs of majors with no courses in common.",
+    )
+    parser.add_argument(
+        "--min-overlap",
+        type=float,
+        help="Leave out pairs where less than this fraction of the base major's courses are in the other major.",
+    )
+    args = parser.parse_args()
+    if args.format == "parquet" and not any(
+        find_spec(engine) for engine in ("pyarrow", "fastparquet")
+    ):
+        parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+    if args.format == "npz" and (args.sparse or args.min_overlap is not None):
+        parser.error(
+            "--format npz saves whole count matrices, so it can't be used with --sparse or --min-overlap"
+        )
+    path = args.output or f"./files/course_overlap_py.{args.format}"
+    if args.format == "csv":
+        write_csv(path, all_overlaps(), args.sparse, args.min_overlap)
+    elif args.format == "parquet":
+        write_parquet(path, all_overlaps(), args.sparse, args.min_overlap)
+    else:
+        write_npz(path, all_overlaps())
@@ -5,13 +5,12 @@ python3 courses_req_by_majors.py 2022
 python3 courses_req_by_majors.py 2022 json > courses_req_by_majors.json
 """
 
-import json
 from sys import stdout
 from typing import NamedTuple
 from parse import major_plans
 from parse_defs import CourseCode
 from university import university
-from util import partition, sorted_dict
+from util import JsonWriter, partition, sorted_dict
 
 
 class CourseTaker(NamedTuple):
@@ -48,20 +47,13 @@ def print_json(year: int) -> None:
         for course in plans.plan(college)
         if course.course_code
     )
-    json.dump(
-        {
-            "colleges": list(university.college_names.items()),
-            "quarterNames": university.terms,
-            "courses": [
-                {
-                    "courseCode": str(course_code),
-                    "takers": takers,
-                }
-                for course_code, takers in sorted_dict(courses, key=CourseCode.parts)
-            ],
-        },
-        stdout,
-    )
+    writer = JsonWriter(stdout)
+    with writer.object():
+        writer.item(list(university.college_names.items()), "colleges")
+        writer.item(university.terms, "quarterNames")
+        with writer.array("courses"):
+            for course_code, takers in sorted_dict(courses, key=CourseCode.parts):
+                writer.item({"courseCode": str(course_code), "takers": takers})
 
 
 def print_readable(year: int) -> None:
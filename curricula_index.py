@@ -9,7 +9,8 @@ from upload import track_uploaded_curricula
 
 __all__ = ["urls"]
 
-_, start_year, end_year = sys.argv
+# Scripts that import this, like diff_plan.py, may take more arguments
+start_year, end_year = sys.argv[1:3]
 
 urls: Dict[Tuple[int, str], str] = {}
 
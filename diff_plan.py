@@ -1,22 +1,38 @@
 """
 This is run by the Makefile.
 
-python3 diff_plan.py > reports/output/academic-plan-diffs.json
+Courses in consecutive years' plans are matched up by `diff`, which only runs
+`SequenceMatcher` on titles that could be the closest match, so diffing every
+major is quick. `--jobs` diffs several majors at a time.
 
-python3 college_ges.py <from> <to> [major] [college]
+Plans are compared by content hash first, so a plan that didn't change from
+the previous year isn't diffed at all. Diffs of plans that did change are
+saved in `files/plan_diff_cache.json` by the hashes of both plans, so
+rebuilding the JSON after adding a year only diffs that year's new plans.
+`--no-cache` ignores the saved diffs.
+
+python3 diff_plan.py 2015 2022 > reports/output/academic-plan-diffs.json
+python3 diff_plan.py 2015 2022 --jobs 4 > reports/output/academic-plan-diffs.json
+python3 diff_plan.py 2015 2022 --no-cache > reports/output/academic-plan-diffs.json
+
+python3 diff_plan.py <from> <to> [major] [college]
 """
 
+from collections import Counter, deque
 import csv
 from difflib import SequenceMatcher
 import json
-from sys import argv, stdout
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import os
+import re
+from sys import stdout
+from typing import Any, Deque, Dict, List, NamedTuple, Set, Tuple
 from curricula_index import urls
 from departments import departments, dept_schools
 
-from parse import major_codes, major_plans
+from parse import MajorPlans, major_codes, major_plans
 from parse_defs import RawCourse
 from university import university
+from util import JsonWriter, map_jobs
 
 
 class Colors:
@@ -127,39 +143,130 @@ def similarity(a: str, b: str) -> float:
     return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
 
+# SequenceMatcher does most of its setup for the second sequence, so one is
+# kept per (lowercase) new course title and compared against old titles
+_matchers: Dict[str, SequenceMatcher[str]] = {}
+
+
+def _matcher(title: str) -> SequenceMatcher[str]:
+    if title not in _matchers:
+        _matchers[title] = SequenceMatcher(None, "", title)
+    return _matchers[title]
+
+
+def _title_tokens(title: str) -> List[str]:
+    """
+    Splits a lowercase course title into words, so a course code like "MATH
+    20A" becomes its subject and number.
+    """
+    return re.findall(r"[a-z0-9]+", title)
+
+
+def _without_first(
+    courses: List[RawCourse], counts: Counter[RawCourse]
+) -> List[RawCourse]:
+    """
+    Removes the first `counts[course]` occurrences of each course.
+    """
+    counts = counts.copy()
+    remaining: List[RawCourse] = []
+    for course in courses:
+        if counts[course] > 0:
+            counts[course] -= 1
+        else:
+            remaining.append(course)
+    return remaining
+
+
+def _could_beat(sim: float, index: int, best: float, best_index: int) -> bool:
+    """
+    Whether a new course at `index` with similarity `sim` (or an upper bound of
+    it) would replace the best match so far, as if the new courses were
+    compared in order and only a strictly more similar course replaced the
+    best. Courses under 50% similar are never matched.
+    """
+    return sim >= 0.5 and (sim > best or sim == best and index < best_index)
+
+
 def diff(old: List[RawCourse], new: List[RawCourse]) -> DiffResults:
-    old_only = old.copy()
-    new_only = new.copy()
+    """
+    Matches identical courses first, then courses with the same title, then
+    each remaining old course with its most similar remaining new course if
+    their titles are at least 50% similar. Ties go to the earlier new course.
+
+    To avoid comparing every pair of titles with `SequenceMatcher`, new
+    courses sharing a word with the old course (such as its subject or course
+    number) are compared first, and the rest are only compared if the cheap
+    upper bounds `real_quick_ratio` and `quick_ratio` say they could still beat
+    the best match so far.
+    """
+    unmatched = Counter(new)
+    identical: Counter[RawCourse] = Counter()
     for course in old:
-        if course in new_only:
-            old_only.remove(course)
-            new_only.remove(course)
+        if unmatched[course] > 0:
+            unmatched[course] -= 1
+            identical[course] += 1
+    old_only: List[RawCourse] = _without_first(old, identical)
+    new_only = _without_first(new, identical)
     changed: List[Tuple[RawCourse, RawCourse]] = []
 
+    new_titles = [course.course_title.lower() for course in new_only]
+    taken = [False] * len(new_only)
+    old_left: List[RawCourse] = []
+
     # Prioritize matching courses with the same course title
-    for course in old_only.copy():
-        for other in new_only:
-            if course.course_title.lower() == other.course_title.lower():
-                old_only.remove(course)
-                new_only.remove(other)
-                changed.append((course, other))
-                break
+    by_title: Dict[str, Deque[int]] = {}
+    for index, title in enumerate(new_titles):
+        by_title.setdefault(title, deque()).append(index)
+    for course in old_only:
+        indices = by_title.get(course.course_title.lower())
+        if indices:
+            index = indices.popleft()
+            taken[index] = True
+            changed.append((course, new_only[index]))
+        else:
+            old_left.append(course)
+
     # Match courses based on similarity
-    for course in old_only.copy():
-        max_similarity = 0
-        most_similar: Optional[RawCourse] = None
-        for other in new_only:
-            sim = similarity(course.course_title, other.course_title)
-            if sim > max_similarity:
+    by_token: Dict[str, List[int]] = {}
+    for index, title in enumerate(new_titles):
+        if not taken[index]:
+            for token in set(_title_tokens(title)):
+                by_token.setdefault(token, []).append(index)
+    old_only = []
+    for course in old_left:
+        title = course.course_title.lower()
+        candidates: Set[int] = set()
+        for token in _title_tokens(title):
+            candidates.update(by_token.get(token, []))
+        max_similarity = 0.0
+        most_similar = -1
+        for index in [
+            *sorted(candidates),
+            *(index for index in range(len(new_only)) if index not in candidates),
+        ]:
+            if taken[index]:
+                continue
+            matcher = _matcher(new_titles[index])
+            matcher.set_seq1(title)
+            if not _could_beat(
+                matcher.real_quick_ratio(), index, max_similarity, most_similar
+            ) or not _could_beat(
+                matcher.quick_ratio(), index, max_similarity, most_similar
+            ):
+                continue
+            sim = matcher.ratio()
+            if _could_beat(sim, index, max_similarity, most_similar):
                 max_similarity = sim
-                most_similar = other
-        if most_similar and max_similarity >= 0.5:
-            old_only.remove(course)
-            new_only.remove(most_similar)
-            changed.append((course, most_similar))
+                most_similar = index
+        if most_similar >= 0:
+            taken[most_similar] = True
+            changed.append((course, new_only[most_similar]))
+        else:
+            old_only.append(course)
 
     return DiffResults(
-        new_only,
+        [course for course, matched in zip(new_only, taken) if not matched],
         old_only,
         changed,
         sum(course.units for course in old),
@@ -192,34 +299,100 @@ def print_major_changes(start: int, end: int, major: str, college: str) -> None:
         differences.print()
 
 
-def diff_all(start: int, end: int) -> None:
-    complexities: Dict[Tuple[int, str, str], float] = {}
-    with open("./files/metrics_fa12_py.csv", newline="") as file:
-        reader = csv.reader(file)
-        next(reader)  # Skip header
-        for (
-            year,
-            major,
-            college,
-            complexity,
-            *_,
-        ) in reader:
-            complexities[int(year), major, college] = float(complexity)
-
-    def diff_major(major: str, college: str):
-        years: List[Any] = []
-        for year in range(start, end):
-            if (
-                major not in major_plans(year)
-                or major not in major_plans(year + 1)
-                or college not in major_plans(year)[major].colleges
-                or college not in major_plans(year + 1)[major].colleges
-            ):
+DIFF_CACHE_PATH = "./files/plan_diff_cache.json"
+# Bump this when `diff` or `DiffResults.to_json` changes the diffs they produce
+# so previously saved diffs aren't reused
+DIFF_CACHE_VERSION = 1
+
+# Maps "<old plan hash> <new plan hash>" to `DiffResults.to_json()`
+_diff_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def load_diff_cache(path: str = DIFF_CACHE_PATH) -> None:
+    try:
+        with open(path) as file:
+            saved = json.load(file)
+    except FileNotFoundError:
+        return
+    if saved.get("version") == DIFF_CACHE_VERSION:
+        _diff_cache.update(saved["diffs"])
+
+
+def save_diff_cache(path: str = DIFF_CACHE_PATH) -> None:
+    # Write to a temporary file first so an interrupted save doesn't leave
+    # behind a corrupt cache
+    with open(path + ".tmp", "w") as file:
+        json.dump({"version": DIFF_CACHE_VERSION, "diffs": _diff_cache}, file)
+    os.replace(path + ".tmp", path)
+
+
+def diff_plans(
+    old_plans: MajorPlans,
+    new_plans: MajorPlans,
+    college: str,
+    new_diffs: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Returns `DiffResults.to_json()` for a college's plans in two years, reusing
+    cached diffs by content hash. Diffs that weren't in the cache are added to
+    both the cache and `new_diffs`.
+    """
+    old_hash = old_plans.plan_hash(college)
+    new_hash = new_plans.plan_hash(college)
+    if old_hash == new_hash:
+        return {"changes": []}
+    key = f"{old_hash} {new_hash}"
+    if key not in _diff_cache:
+        _diff_cache[key] = new_diffs[key] = diff(
+            old_plans.raw_plans[college], new_plans.raw_plans[college]
+        ).to_json()
+    # The caller adds to the dictionary, so don't hand out the cached one
+    return dict(_diff_cache[key])
+
+
+_complexities: Dict[Tuple[int, str, str], float] = {}
+
+
+def load_complexities() -> Dict[Tuple[int, str, str], float]:
+    if not _complexities:
+        with open("./files/metrics_fa12_py.csv", newline="") as file:
+            reader = csv.reader(file)
+            next(reader)  # Skip header
+            for (
+                year,
+                major,
+                college,
+                complexity,
+                *_,
+            ) in reader:
+                _complexities[int(year), major, college] = float(complexity)
+    return _complexities
+
+
+def diff_major(
+    job: Tuple[int, int, str],
+) -> Tuple[Dict[str, List[Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Diffs each of a major's college plans between every pair of consecutive
+    years from `start` to `end`. Returns the changes for each college code
+    with plans to compare, and the diffs that weren't already cached so they
+    can be added to the main process's cache.
+
+    This is a top-level function so `diff_all` can run it in worker processes.
+    """
+    start, end, major = job
+    complexities = load_complexities()
+    colleges: Dict[str, List[Any]] = {}
+    new_diffs: Dict[str, Dict[str, Any]] = {}
+    for year in range(start, end):
+        if major not in major_plans(year) or major not in major_plans(year + 1):
+            continue
+        old_plans = major_plans(year)[major]
+        new_plans = major_plans(year + 1)[major]
+        for college in university.college_names.keys():
+            if college not in old_plans.colleges or college not in new_plans.colleges:
                 continue
-            differences = diff(
-                major_plans(year)[major].raw_plans[college],
-                major_plans(year + 1)[major].raw_plans[college],
-            ).to_json()
+            differences = diff_plans(old_plans, new_plans, college, new_diffs)
             differences["year"] = year + 1
             differences["url"] = urls.get((year + 1, major))
             if (
@@ -230,10 +403,42 @@ def diff_all(start: int, end: int) -> None:
                     complexities[year, major, college],
                     complexities[year + 1, major, college],
                 ]
-            years.append(differences)
-        return years
+            colleges.setdefault(college, []).append(differences)
+    return colleges, new_diffs
 
-    majors_by_dept: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+def _write_major(
+    writer: JsonWriter, major_code: str, colleges: Dict[str, List[Any]]
+) -> None:
+    for college_code, college_name in university.college_names.items():
+        output = colleges.get(college_code)
+        if output:
+            first_year: int = output[0]["year"]
+            writer.item(
+                {
+                    "changes": output,
+                    "first": {
+                        "year": first_year - 1,
+                        "url": urls.get((first_year - 1, major_code)),
+                    },
+                },
+                college_name,
+            )
+
+
+def diff_all(start: int, end: int, jobs: int = 1, use_cache: bool = True) -> None:
+    """
+    Prints the JSON of every major's plan changes from `start` to `end`,
+    diffing `jobs` majors at a time. If `use_cache` is true, diffs are reused
+    from and saved to `DIFF_CACHE_PATH`.
+    """
+    # Load everything workers need before they're forked
+    load_complexities()
+    if use_cache:
+        load_diff_cache()
+    # Group majors in the order they're output, so each major's changes can be
+    # written as soon as it's diffed
+    majors_by_dept: Dict[str, Dict[str, Dict[str, str]]] = {}
     for year in range(start, end + 1):
         for major_code in major_plans(year).keys():
             major = f"{major_code} {major_codes()[major_code].name}"
@@ -244,25 +449,32 @@ def diff_all(start: int, end: int) -> None:
             if department not in majors_by_dept[school]:
                 majors_by_dept[school][department] = {}
             if major not in majors_by_dept[school][department]:
-                majors_by_dept[school][department][major] = {}
-            for college_code, college_name in university.college_names.items():
-                output = diff_major(major_code, college_code)
-                if output:
-                    first_year: int = output[0]["year"]
-                    majors_by_dept[school][department][major][college_name] = {
-                        "changes": output,
-                        "first": {
-                            "year": first_year - 1,
-                            "url": urls.get((first_year - 1, major_code)),
-                        },
-                    }
-    json.dump(
-        {
-            "diffs": majors_by_dept,
-            "collegeNames": list(university.college_names.values()),
-        },
-        stdout,
-    )
+                majors_by_dept[school][department][major] = major_code
+    with map_jobs(
+        diff_major,
+        [
+            (start, end, major_code)
+            for dept_majors in majors_by_dept.values()
+            for majors in dept_majors.values()
+            for major_code in majors.values()
+        ],
+        jobs,
+    ) as results:
+        writer = JsonWriter(stdout)
+        with writer.object():
+            with writer.object("diffs"):
+                for school, dept_majors in majors_by_dept.items():
+                    with writer.object(school):
+                        for department, majors in dept_majors.items():
+                            with writer.object(department):
+                                for major, major_code in majors.items():
+                                    colleges, new_diffs = next(results)
+                                    _diff_cache.update(new_diffs)
+                                    with writer.object(major):
+                                        _write_major(writer, major_code, colleges)
+            writer.item(list(university.college_names.values()), "collegeNames")
+    if use_cache:
+        save_diff_cache()
 
 
 if __name__ == "__main__":
@@ -273,14 +485,33 @@ if __name__ == "__main__":
     if os.name == "nt":
         os.system("color")
 
-    if len(argv) < 3:
-        raise ValueError(
-            "Need years: python3 college_ges.py <from> <to> [major] [college]"
-        )
-    start = int(argv[1])
-    end = int(argv[2])
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="Show how a major's degree plans changed over the years, or output every major's changes as JSON."
+    )
+    parser.add_argument("start", type=int, help="The first plan year.")
+    parser.add_argument("end", type=int, help="The last plan year.")
+    parser.add_argument(
+        "major",
+        nargs="?",
+        help="A major code to pretty-print changes for. Default: output JSON for every major",
+    )
+    parser.add_argument("college", nargs="?", help="The college of the plans.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of majors to diff at a time when outputting JSON. Default: 1",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Don't reuse or save diffs in {DIFF_CACHE_PATH}.",
+    )
+    args = parser.parse_args()
 
-    if len(argv) < 5:
-        diff_all(start, end)
+    if args.major is None or args.college is None:
+        diff_all(args.start, args.end, args.jobs, not args.no_cache)
     else:
-        print_major_changes(start, end, *argv[1:3])
+        print_major_changes(args.start, args.end, args.major, args.college)
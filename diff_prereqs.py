@@ -3,26 +3,28 @@ This is run by the Makefile.
 
 python3 diff_prereqs.py > reports/output/prereq-diffs-fragment.html
 python3 diff_prereqs.py timeline > reports/output/prereq-timeline-fragment.html
+
+Each course's diffs are saved to `files/prereq_history.json`, so when a new term
+is added, only that term needs to be diffed. If an earlier term's CSV file
+changes, the history is rebuilt from scratch.
 """
 
-from typing import List, NamedTuple, Optional, Tuple, TypeVar, Union
+import hashlib
+import json
+import os
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple, Union
 from common_prereqs import parse_int
 from parse import prereqs, terms
 from parse_defs import CourseCode, Prerequisite, TermCode
 
 Prereqs = List[List[Prerequisite]]
-
-T = TypeVar("T")
+Fingerprint = FrozenSet[Tuple[Prerequisite, ...]]
 
 
-def remove_duplicates(ls: List[T]) -> List[T]:
-    return [item for i, item in enumerate(ls) if item not in ls[0:i]]
+HISTORY_PATH = "./files/prereq_history.json"
+# Bump when the format of the history file or how diffs are made changes
+HISTORY_VERSION = 2
 
-
-course_codes = sorted(
-    {course for term in terms() for course in prereqs(term).keys()},
-    key=lambda subject_code: (subject_code.subject, *parse_int(subject_code.number)),
-)
 # Ignore special and medical summer, which seems to often omit prereqs only for
 # them to be readded in fall
 term_codes = sorted(
@@ -32,13 +34,13 @@ term_codes = sorted(
 )
 
 
-def find_requirement_with_course(
-    prereqs: Prereqs, course_code: CourseCode
-) -> Optional[List[Prerequisite]]:
-    for requirement in prereqs:
-        for course, _ in requirement:
-            if course == course_code:
-                return requirement
+def fingerprint(prereqs: Prereqs) -> Fingerprint:
+    """
+    A canonical, hashable form of a course's normalized prereqs (see
+    `normalize_prereqs`). `diff_prereqs` finds no changes between two prereq
+    lists exactly when their fingerprints are equal.
+    """
+    return frozenset(tuple(req) for req in prereqs)
 
 
 class Change(NamedTuple):
@@ -77,84 +79,287 @@ def diff_prereqs(
             return NewCourse(term, new)
     elif new is None:
         return RemovedCourse(term)
-    old_only = [req for req in old if req not in new]
-    new_only = [req for req in new if req not in old]
-    if not old_only and not new_only:
+    old_keys = fingerprint(old)
+    new_keys = fingerprint(new)
+    if old_keys == new_keys:
         return None
+    old_only = [req for req in old if tuple(req) not in new_keys]
+    new_only = [req for req in new if tuple(req) not in old_keys]
+
+    # Indices of the requirements in `new_only` that include each course, in
+    # order
+    new_with_course: Dict[CourseCode, List[int]] = {}
+    for i, req in enumerate(new_only):
+        for course, _ in req:
+            new_with_course.setdefault(course, []).append(i)
+    matched_old: Set[int] = set()
+    matched_new: Set[int] = set()
 
     changes: List[Change] = []
-    for old_req in old_only[:]:
+    for i, old_req in enumerate(old_only):
         for course, _ in old_req:
-            new_req = find_requirement_with_course(new_only, course)
-            if not new_req:
+            j = next(
+                (j for j in new_with_course.get(course, []) if j not in matched_new),
+                None,
+            )
+            if j is None:
                 continue
-            old_only.remove(old_req)
-            new_only.remove(new_req)
-
-            old_req = old_req.copy()
-            new_req = new_req.copy()
+            matched_old.add(i)
+            matched_new.add(j)
+
+            # Requirements have no duplicates, so a prereq in the old
+            # requirement either is in the new requirement, is in it with
+            # `allow_concurrent` flipped, or was removed
+            new_remaining = dict.fromkeys(new_only[j])
+            old_remaining: List[Prerequisite] = []
             unchanged: List[Prerequisite] = []
             flipped_concurrent: List[Prerequisite] = []
-            for prereq in old_req[:]:
-                if prereq in new_req:
-                    old_req.remove(prereq)
-                    new_req.remove(prereq)
+            for prereq in old_req:
+                flipped = Prerequisite(prereq.course_code, not prereq.allow_concurrent)
+                if prereq in new_remaining:
+                    del new_remaining[prereq]
                     unchanged.append(prereq)
-                    continue
-                for new_prereq in new_req:
-                    if new_prereq.course_code == prereq.course_code:
-                        old_req.remove(prereq)
-                        new_req.remove(new_prereq)
-                        flipped_concurrent.append(new_prereq)
-                        break
-            changes.append(Change(unchanged, flipped_concurrent, old_req, new_req))
+                elif flipped in new_remaining:
+                    del new_remaining[flipped]
+                    flipped_concurrent.append(flipped)
+                else:
+                    old_remaining.append(prereq)
+            changes.append(
+                Change(
+                    unchanged, flipped_concurrent, old_remaining, list(new_remaining)
+                )
+            )
             break
-    return Changed(term, new_only, old_only, changes)
+    return Changed(
+        term,
+        [req for j, req in enumerate(new_only) if j not in matched_new],
+        [req for i, req in enumerate(old_only) if i not in matched_old],
+        changes,
+    )
+
+
+def normalize_prereqs(reqs: Prereqs) -> Prereqs:
+    """
+    Removes empty requirements and duplicate requirements and alternatives,
+    keeping the first of each.
+    """
+    return [
+        list(req)
+        for req in dict.fromkeys(tuple(dict.fromkeys(req)) for req in reqs if req)
+    ]
+
+
+def _encode_prereqs(reqs: Prereqs) -> Any:
+    return [
+        [
+            [course.subject, course.number, allow_concurrent]
+            for course, allow_concurrent in req
+        ]
+        for req in reqs
+    ]
+
+
+def _decode_prereqs(reqs: Any) -> Prereqs:
+    return [
+        [
+            Prerequisite(CourseCode(subject, number), allow_concurrent)
+            for subject, number, allow_concurrent in req
+        ]
+        for req in reqs
+    ]
+
+
+def _encode_diff(diff: Diff) -> Any:
+    if isinstance(diff, NewCourse):
+        return {
+            "type": "new",
+            "term": diff.term,
+            "prereqs": _encode_prereqs(diff.prereqs),
+        }
+    if isinstance(diff, RemovedCourse):
+        return {"type": "removed", "term": diff.term}
+    return {
+        "type": "changed",
+        "term": diff.term,
+        "added": _encode_prereqs(diff.added),
+        "removed": _encode_prereqs(diff.removed),
+        "changes": [_encode_prereqs(list(change)) for change in diff.changes],
+    }
+
+
+def _decode_diff(diff: Any) -> Diff:
+    term = TermCode(diff["term"])
+    if diff["type"] == "new":
+        return NewCourse(term, _decode_prereqs(diff["prereqs"]))
+    if diff["type"] == "removed":
+        return RemovedCourse(term)
+    return Changed(
+        term,
+        _decode_prereqs(diff["added"]),
+        _decode_prereqs(diff["removed"]),
+        [Change(*_decode_prereqs(change)) for change in diff["changes"]],
+    )
+
+
+def _term_stamp(term: TermCode) -> str:
+    """
+    Identifies the version of a term's prereq file by its contents, because
+    `split_csv.py` rewrites every term's file, even unchanged ones, whenever a
+    new term is added.
+    """
+    try:
+        with open(f"./files/prereqs/prereqs_{term}.csv", "rb") as file:
+            return hashlib.file_digest(file, "sha256").hexdigest()
+    except FileNotFoundError:
+        return ""
+
+
+class HistoryStore:
+    """
+    The prereq diffs of every course, up to and including the last term in
+    `terms`.
+
+    `last_prereqs` has the normalized prereqs of each course that exists as of
+    the last term diffed, and `last_fingerprints` their fingerprints so courses
+    whose prereqs didn't change can be skipped without diffing them.
+    `course_codes` also includes courses that only appear in terms that aren't
+    diffed (see `term_codes`).
+    """
+
+    terms: List[Tuple[TermCode, str]]
+    course_codes: Set[CourseCode]
+    last_prereqs: Dict[CourseCode, Prereqs]
+    last_fingerprints: Dict[CourseCode, Fingerprint]
+    diffs: Dict[CourseCode, List[Diff]]
+
+    def __init__(self) -> None:
+        self.terms = []
+        self.course_codes = set()
+        self.last_prereqs = {}
+        self.last_fingerprints = {}
+        self.diffs = {}
+
+    def add_term(self, term: TermCode, stamp: str) -> None:
+        term_prereqs = prereqs(term)
+        self.terms.append((term, stamp))
+        self.course_codes |= term_prereqs.keys()
+        if term not in term_codes:
+            return
+        for course_code in term_prereqs.keys() | self.last_prereqs.keys():
+            if course_code in term_prereqs:
+                reqs = normalize_prereqs(term_prereqs[course_code])
+                keys = fingerprint(reqs)
+                if keys == self.last_fingerprints.get(course_code):
+                    # Still update the prereqs because their order may have
+                    # changed, which affects how later diffs are listed
+                    self.last_prereqs[course_code] = reqs
+                    continue
+            else:
+                reqs = None
+                keys = None
+            diff = diff_prereqs(term, self.last_prereqs.get(course_code), reqs)
+            if diff:
+                self.diffs.setdefault(course_code, []).append(diff)
+            if reqs is None or keys is None:
+                del self.last_prereqs[course_code]
+                del self.last_fingerprints[course_code]
+            else:
+                self.last_prereqs[course_code] = reqs
+                self.last_fingerprints[course_code] = keys
+
+    def to_json(self) -> Any:
+        return {
+            "version": HISTORY_VERSION,
+            "terms": self.terms,
+            "courses": [
+                {
+                    "course": list(course_code),
+                    "last": (
+                        _encode_prereqs(self.last_prereqs[course_code])
+                        if course_code in self.last_prereqs
+                        else None
+                    ),
+                    "diffs": [
+                        _encode_diff(diff) for diff in self.diffs.get(course_code, [])
+                    ],
+                }
+                for course_code in self.course_codes
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data: Any) -> "HistoryStore":
+        store = cls()
+        store.terms = [(TermCode(term), stamp) for term, stamp in data["terms"]]
+        for course in data["courses"]:
+            course_code = CourseCode(*course["course"])
+            store.course_codes.add(course_code)
+            if course["last"] is not None:
+                last_prereqs = _decode_prereqs(course["last"])
+                store.last_prereqs[course_code] = last_prereqs
+                store.last_fingerprints[course_code] = fingerprint(last_prereqs)
+            if course["diffs"]:
+                store.diffs[course_code] = [
+                    _decode_diff(diff) for diff in course["diffs"]
+                ]
+        return store
+
+
+def load_history() -> HistoryStore:
+    """
+    Loads the saved history and diffs any terms added since it was saved.
+    """
+    stamps = [(term, _term_stamp(term)) for term in terms()]
+    try:
+        with open(HISTORY_PATH) as file:
+            data = json.load(file)
+        store = (
+            HistoryStore.from_json(data)
+            if data["version"] == HISTORY_VERSION
+            else HistoryStore()
+        )
+    except FileNotFoundError:
+        store = HistoryStore()
+    if store.terms != stamps[: len(store.terms)]:
+        # An earlier term was changed or removed
+        store = HistoryStore()
+    if len(store.terms) == len(stamps):
+        return store
+    for term, stamp in stamps[len(store.terms) :]:
+        store.add_term(term, stamp)
+    # The Makefile (and pipeline.py) may run the diff and timeline at the same
+    # time, so give each process its own temporary file
+    temp_path = f"{HISTORY_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(store.to_json(), file)
+    os.replace(temp_path, HISTORY_PATH)
+    return store
 
 
 class History(NamedTuple):
     course_code: CourseCode
     has_changed: bool
-    prereq_history: List[Tuple[TermCode, Optional[Prereqs]]] = []
     diffs: List[Diff] = []
     still_exists: bool = False
 
 
-def get_history(course_code: CourseCode) -> History:
-    prereq_history = [
-        (
-            term_code,
-            (
-                remove_duplicates(
-                    [
-                        remove_duplicates(req)
-                        for req in prereqs(term_code)[course_code]
-                        if req
-                    ]
-                )
-                if course_code in prereqs(term_code)
-                else None
-            ),
-        )
-        for term_code in term_codes
-    ]
-    diffs: List[Diff] = []
-    for i, (term_code, reqs) in enumerate(prereq_history):
-        diff = diff_prereqs(
-            term_code,
-            prereq_history[i - 1][1] if i > 0 else None,
-            reqs,
-        )
-        if diff:
-            diffs.append(diff)
-    if len(diffs) <= 1:
-        return History(course_code, False)
-    still_exists = prereq_history[-1][1] is not None
-    return History(course_code, True, prereq_history, diffs, still_exists)
-
-
 def get_changed_courses() -> List[History]:
-    return [get_history(course_code) for course_code in course_codes]
+    store = load_history()
+    histories: List[History] = []
+    for course_code in sorted(
+        store.course_codes,
+        key=lambda subject_code: (
+            subject_code.subject,
+            *parse_int(subject_code.number),
+        ),
+    ):
+        diffs = store.diffs.get(course_code, [])
+        if len(diffs) <= 1:
+            histories.append(History(course_code, False))
+        else:
+            still_exists = course_code in store.last_prereqs
+            histories.append(History(course_code, True, diffs, still_exists))
+    return histories
 
 
 def print_prereq_diff(course_id: str, diff: Diff) -> None:
@@ -238,7 +443,7 @@ def print_diff() -> None:
     print('<main className="main">')
     print("<h1>Changes made to course prerequisites over time by course</h1>")
     print("<p>Only courses whose prerequisites have changed are shown.</p>")
-    for course_code, has_changed, _, diffs, still_exists in changed_courses:
+    for course_code, has_changed, diffs, still_exists in changed_courses:
         if not has_changed:
             continue
         if not still_exists:
@@ -292,7 +497,7 @@ def print_timeline() -> None:
     for term_code in term_codes[1:]:
         changed = [
             (course_code, diff)
-            for course_code, _, _, diffs, _ in changed_courses
+            for course_code, _, diffs, _ in changed_courses
             for diff in (
                 next(
                     (
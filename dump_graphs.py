@@ -2,88 +2,189 @@
 python3 dump_graphs.py json
 python3 dump_graphs.py html (for_public) > reports/output/plan-editor-index.html
 python3 dump_graphs.py files
+python3 dump_graphs.py files --jobs 4
+python3 dump_graphs.py files --force
 """
 
+import hashlib
 import json
 import os
 import re
 import sys
-from typing import Dict, List, Tuple
+from typing import Dict, List, NamedTuple, Tuple
 from urllib.parse import urlencode
 from departments import departments, dept_schools
 from output import MajorOutput
-from parse import major_codes, major_plans, prereqs, terms
+from parse import FIRST_PLAN_YEAR, load_all_plans, major_codes, prereqs, terms
 from university import university
+from util import JsonWriter, map_jobs
 
+PLAN_FILES_DIR = "./plan_csvs/"
+MANIFEST_PATH = PLAN_FILES_DIR + "manifest.json"
 
-def render_plan_files() -> None:
-    min_year = 2015
+# Content hashes of the files written by the last run, from the manifest.
+# Loaded before workers are forked so they can tell which files changed.
+_previous_hashes: Dict[str, str] = {}
+
+
+class PlanFile(NamedTuple):
+    """
+    A file in `plan_csvs/`. `path` is relative to `plan_csvs/`, and `changed`
+    is whether the file was rewritten.
+    """
+
+    path: str
+    hash: str
+    changed: bool
+
+
+def _write_plan_file(path: str, content: str) -> PlanFile:
+    """
+    Writes a file in `plan_csvs/` unless the last run wrote the same content
+    to it.
+    """
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    full_path = PLAN_FILES_DIR + path
+    if _previous_hashes.get(path) == content_hash and os.path.exists(full_path):
+        return PlanFile(path, content_hash, False)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as file:
+        file.write(content)
+    return PlanFile(path, content_hash, True)
+
+
+def _render_major_files(job: Tuple[int, str]) -> List[PlanFile]:
+    """
+    Writes the CSV files for a major's plans in a year. This is a top-level
+    function so `render_plan_files` can run it in worker processes.
+    """
+    year, major_code = job
+    major_plan = load_all_plans()[year, 4][major_code]
+    output = MajorOutput(major_plan)
+    files = [
+        _write_plan_file(
+            f"{year}/{major_code}/{year}_{major_code}.csv", output.output()
+        )
+    ]
+    for college in university.college_codes:
+        if college in major_plan.colleges:
+            files.append(
+                _write_plan_file(
+                    f"{year}/{major_code}/{year}_{major_code}_{college}.csv",
+                    output.output(college),
+                )
+            )
+    return files
+
+
+def _render_prereq_file(term: str) -> PlanFile:
+    lines = [
+        json.dumps(str(course_code))
+        + ": "
+        + json.dumps([[repr(alt) for alt in req] for req in reqs])
+        + "\n"
+        for course_code, reqs in prereqs(term).items()
+    ]
+    return _write_plan_file(
+        f"prereqs/{term}.json", ("{ " + ", ".join(lines) if lines else "") + "}\n"
+    )
+
+
+def render_plan_files(jobs: int = 1, force: bool = False) -> None:
+    """
+    Writes every plan's CSV files and every term's prereqs to `plan_csvs/`,
+    rendering `jobs` majors at a time.
+
+    Files whose content hasn't changed since the last run are left alone, and
+    files the last run wrote that are no longer generated are deleted.
+    `plan_csvs/manifest.json` lists the content hash of every file, as well as
+    which files were rewritten or deleted by this run. `force` rewrites every
+    file, but still deletes the files the last run wrote that are no longer
+    generated.
+    """
+    min_year = FIRST_PLAN_YEAR
     max_year = min_year
-    for year in range(min_year, 2050):
-        all_plans = major_plans(year)
-        if all_plans == {}:
-            break
-        max_year = year
-        for major_code, major_plan in all_plans.items():
-            output = MajorOutput(major_plan)
-            os.makedirs(f"./plan_csvs/{year}/{major_code}/", exist_ok=True)
-            with open(
-                f"./plan_csvs/{year}/{major_code}/{year}_{major_code}.csv",
-                "w",
-            ) as file:
-                file.write(output.output())
-            for college in university.college_codes:
-                if college in major_plan.colleges:
-                    with open(
-                        f"./plan_csvs/{year}/{major_code}/{year}_{major_code}_{college}.csv",
-                        "w",
-                    ) as file:
-                        file.write(output.output(college))
+    previous_hashes: Dict[str, str] = {}
+    try:
+        with open(MANIFEST_PATH) as file:
+            previous_hashes = json.load(file)["files"]
+    except FileNotFoundError:
+        pass
+    _previous_hashes.clear()
+    if not force:
+        _previous_hashes.update(previous_hashes)
 
-    os.makedirs(f"./plan_csvs/prereqs/", exist_ok=True)
+    major_jobs: List[Tuple[int, str]] = []
+    for year, all_plans in load_all_plans().by_year(start=min_year):
+        max_year = year
+        major_jobs += [(year, major_code) for major_code in all_plans.keys()]
+    # Parse prereqs before workers are forked
     for term in terms():
-        with open(f"./plan_csvs/prereqs/{term}.json", "w") as file:
-            for i, (course_code, reqs) in enumerate(prereqs(term).items()):
-                file.write("{ " if i == 0 else ", ")
-                json.dump(str(course_code), file)
-                file.write(": ")
-                json.dump(
-                    [[repr(alt) for alt in req] for req in reqs],
-                    file,
-                )
-                file.write("\n")
-            file.write("}\n")
+        prereqs(term)
+
+    files: List[PlanFile] = []
+    with map_jobs(_render_major_files, major_jobs, jobs, chunksize=8) as major_results:
+        for major_files in major_results:
+            files += major_files
+    with map_jobs(_render_prereq_file, terms(), jobs) as prereq_results:
+        files += prereq_results
+    files.append(
+        _write_plan_file(
+            "metadata.json",
+            json.dumps(
+                {
+                    "min_plan_year": min_year,
+                    "max_plan_year": max_year,
+                    "min_prereq_term": terms()[0],
+                    "max_prereq_term": terms()[-1],
+                },
+                indent="\t",
+            )
+            + "\n",
+        )
+    )
 
-    with open("./plan_csvs/metadata.json", "w") as file:
+    hashes = {file.path: file.hash for file in files}
+    removed = sorted(path for path in previous_hashes if path not in hashes)
+    for path in removed:
+        try:
+            os.remove(PLAN_FILES_DIR + path)
+        except FileNotFoundError:
+            pass
+    with open(MANIFEST_PATH + ".tmp", "w") as file:
         json.dump(
             {
-                "min_plan_year": min_year,
-                "max_plan_year": max_year,
-                "min_prereq_term": terms()[0],
-                "max_prereq_term": terms()[-1],
+                "files": hashes,
+                "changed": [file.path for file in files if file.changed],
+                "removed": removed,
             },
             file,
             indent="\t",
         )
         file.write("\n")
+    os.replace(MANIFEST_PATH + ".tmp", MANIFEST_PATH)
+    print(
+        f"Wrote {sum(file.changed for file in files)} of {len(files)} files, removed {len(removed)}",
+        file=sys.stderr,
+    )
 
 
 def render_plan_json() -> None:
-    plan_jsons: Dict[str, str] = {}
-    for year in range(2015, 2050):
-        all_plans = major_plans(year)
-        if all_plans == {}:
-            break
-        for major_code, major_plan in all_plans.items():
-            output = MajorOutput(major_plan)
-            for college in university.college_codes:
-                if college in major_plan.colleges:
-                    plan_jsons[f"{year}.{major_code}.{college}"] = re.sub(
-                        r",+\n",
-                        "\n",
-                        output.output(college).replace("\r\n", "\n"),
-                    )
-    json.dump(plan_jsons, sys.stdout, separators=(",", ":"))
+    writer = JsonWriter(sys.stdout, separators=(",", ":"))
+    with writer.object():
+        for year, all_plans in load_all_plans().by_year():
+            for major_code, major_plan in all_plans.items():
+                output = MajorOutput(major_plan)
+                for college in university.college_codes:
+                    if college in major_plan.colleges:
+                        writer.item(
+                            re.sub(
+                                r",+\n",
+                                "\n",
+                                output.output(college).replace("\r\n", "\n"),
+                            ),
+                            f"{year}.{major_code}.{college}",
+                        )
 
 
 def escape_html(string: str) -> str:
@@ -98,10 +199,7 @@ def escape_html(string: str) -> str:
 def render_plan_urls(for_public: bool = False) -> None:
     qs_by_dept: Dict[str, Dict[str, Dict[str, Dict[int, List[Tuple[str, str]]]]]] = {}
     years: List[int] = []
-    for year in range(2015, 2050):
-        all_plans = major_plans(year)
-        if all_plans == {}:
-            break
+    for year, all_plans in load_all_plans().by_year():
         years.insert(0, year)
         for major_code, major_plan in all_plans.items():
             department = departments[major_codes()[major_code].department]
@@ -125,18 +223,14 @@ def render_plan_urls(for_public: bool = False) -> None:
     titles = json.dumps(
         {
             f"{major_code}.{college}": f"{major_code} ({university.college_names[college]}, !YEAR!): {major_codes()[major_code].name}"
-            for year in range(2015, 2050)
-            for all_plans in (major_plans(year),)
-            if all_plans != {}
+            for _, all_plans in load_all_plans().by_year()
             for major_code, major_plan in all_plans.items()
             for college in university.college_codes
             if college in major_plan.colleges
         }
         | {
             f"{major_code}.": f"{major_code} (!YEAR!): {major_codes()[major_code].name}"
-            for year in range(2015, 2050)
-            for all_plans in (major_plans(year),)
-            if all_plans != {}
+            for _, all_plans in load_all_plans().by_year()
             for major_code in all_plans.keys()
         }
     ).replace("'", "\\'")
@@ -223,12 +317,37 @@ def render_plan_urls(for_public: bool = False) -> None:
 
 
 if __name__ == "__main__":
-    if sys.argv[1] == "json":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="Output plans for the plan graph and plan editor, or an index of them."
+    )
+    parser.add_argument(
+        "mode",
+        choices=["json", "files", "html"],
+        help="json: every plan's CSV in one JSON object. files: plan CSVs and prereqs in plan_csvs/. html: a list of links to plan graphs.",
+    )
+    parser.add_argument(
+        "for_public",
+        nargs="?",
+        choices=["for_public"],
+        help="For html, link to the public plan graph.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="For files, the number of majors to render at a time. Default: 1",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="For files, rewrite files even if they haven't changed.",
+    )
+    args = parser.parse_args()
+    if args.mode == "json":
         render_plan_json()
-    elif sys.argv[1] == "files":
-        render_plan_files()
-    elif sys.argv[1] == "html":
-        render_plan_urls(len(sys.argv) > 2 and sys.argv[2] == "for_public")
+    elif args.mode == "files":
+        render_plan_files(args.jobs, args.force)
     else:
-        print("unexpected argument: %s" % sys.argv[1])
-        exit(1)
+        render_plan_urls(args.for_public is not None)
@@ -1,13 +1,15 @@
 """
 python3 dump_prereqs.py FA22
 python3 dump_prereqs.py FA22 table > files/blocked.csv
+python3 dump_prereqs.py table --all-terms > files/blocked_all_terms.csv
 """
 
 import json
 import sys
-from typing import Dict, List, Set
-from parse import prereqs
+from typing import Dict, List, Optional, Set
+from parse import prereqs, terms
 from parse_defs import CourseCode, Prerequisite
+from prereq_graph import PrereqGraph
 
 Prereqs = Dict[CourseCode, List[List[Prerequisite]]]
 
@@ -28,39 +30,50 @@ def dump_prereqs(all_reqs: Prereqs) -> None:
         )
 
 
-def prereqs_satisfied(taken: Set[CourseCode], reqs: List[List[Prerequisite]]) -> bool:
-    for req in reqs:
-        for alt in req:
-            if alt.course_code in taken:
-                return True
-    return False
-
-
 def blocking_table(all_reqs: Prereqs) -> None:
     """
     Creates a CSV listing how many courses each course blocks.
     """
     print("Course,Courses blocked")
 
-    # Not efficient, but more closely mimics the algorithm that prereq-tree uses
+    # Like prereq-tree, a course counts as unlocked once *any* of its prereqs
+    # is taken, so the courses a course blocks are just its descendants in the
+    # prereq graph
+    graph = PrereqGraph(all_reqs)
     for blocker in sorted(all_reqs.keys()):
-        taken: Set[CourseCode] = {blocker}
-        while True:
-            new_courses: Set[CourseCode] = set()
-            for course_code, reqs in all_reqs.items():
-                if not reqs or course_code in taken:
-                    continue
-                if prereqs_satisfied(taken, reqs):
-                    new_courses.add(course_code)
-            if new_courses:
-                taken |= new_courses
-            else:
-                break
-        print(f"{blocker},{len(taken) - 1}")
+        print(f"{blocker},{graph.blocked_count(blocker)}")
+
+
+def blocking_table_all_terms() -> None:
+    """
+    Like `blocking_table`, but creates one wide CSV with a column for every
+    term. A cell is empty if the course isn't offered that term.
+    """
+    term_codes = terms()
+    counts: List[Dict[CourseCode, int]] = []
+    graph: Optional[PrereqGraph] = None
+    for term in term_codes:
+        all_reqs = prereqs(term)
+        # Prereqs barely change between consecutive terms, so the graph reuses
+        # the previous term's descendants for courses that can't reach any
+        # changed prereq. Only keep one graph at a time because the closures
+        # are big
+        graph = PrereqGraph(all_reqs, graph)
+        counts.append({course: graph.blocked_count(course) for course in all_reqs})
+
+    courses: Set[CourseCode] = set()
+    for term_counts in counts:
+        courses |= term_counts.keys()
+    print(",".join(["Course", *term_codes]))
+    for course in sorted(courses):
+        cells = (term_counts.get(course) for term_counts in counts)
+        print(",".join([str(course), *("" if n is None else str(n) for n in cells)]))
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 2 and sys.argv[2] == "table":
+    if sys.argv[1:] == ["table", "--all-terms"]:
+        blocking_table_all_terms()
+    elif len(sys.argv) > 2 and sys.argv[2] == "table":
         blocking_table(prereqs(sys.argv[1]))
     else:
         dump_prereqs(prereqs(sys.argv[1]))
@@ -0,0 +1,457 @@
+"""
+A local stand-in for the parts of the Curricular Analytics website that
+`api.Session` uses (see `docs/ca-api.md`), for testing and benchmarking uploads
+without touching curricularanalytics.org. Everything is kept in memory.
+
+Any session cookie is accepted except an empty one, and the CSRF token is
+`FakeCsrfToken+0=`. Every request can be slowed down by a fixed latency, and a
+fraction of requests can fail with a 503 to exercise retries.
+
+Exports:
+    `FakeServer`, which serves the fake website from a background thread.
+
+python3 fake_ca.py --port 8000 --latency 0.2
+CA_HOST=http://localhost:8000 CA_SESSION=x python3 upload.py --year 2023 --all --jobs 4
+"""
+
+from email.parser import BytesParser
+from email.policy import HTTP
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+from threading import Lock, Thread
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, cast
+from urllib.parse import parse_qs, urlsplit
+
+__all__ = ["FakeServer"]
+
+CSRF_TOKEN = "FakeCsrfToken+0="
+
+
+class FakeCurriculum(NamedTuple):
+    curriculum_id: int
+    name: str
+    organization_id: int
+    cip_code: str
+    year: int
+    created: int
+    data: Any
+
+
+class FakeDegreePlan(NamedTuple):
+    plan_id: int
+    name: str
+    curriculum_id: int
+    data: Any
+
+
+class FakeState:
+    """
+    The curricula and degree plans on the fake website. Methods are called
+    from the server's request threads, so they hold a lock.
+    """
+
+    curricula: Dict[int, FakeCurriculum]
+    degree_plans: Dict[int, FakeDegreePlan]
+    requests: int
+    _next_id: int
+    _lock: Lock
+
+    def __init__(self) -> None:
+        self.curricula = {}
+        self.degree_plans = {}
+        self.requests = 0
+        self._next_id = 1
+        self._lock = Lock()
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _new_id(self) -> int:
+        new_id = self._next_id
+        self._next_id += 1
+        return new_id
+
+    def add_curriculum(
+        self, name: str, organization_id: int, cip_code: str, year: int, data: Any
+    ) -> int:
+        with self._lock:
+            curriculum_id = self._new_id()
+            self.curricula[curriculum_id] = FakeCurriculum(
+                curriculum_id,
+                name,
+                organization_id,
+                cip_code,
+                year,
+                curriculum_id,
+                data,
+            )
+            return curriculum_id
+
+    def add_degree_plan(self, name: str, curriculum_id: int, data: Any) -> int:
+        with self._lock:
+            if curriculum_id not in self.curricula:
+                raise KeyError(curriculum_id)
+            plan_id = self._new_id()
+            self.degree_plans[plan_id] = FakeDegreePlan(
+                plan_id, name, curriculum_id, data
+            )
+            return plan_id
+
+    def list_curricula(
+        self, column: int, descending: bool, start: int, length: int, search: str
+    ) -> List[FakeCurriculum]:
+        with self._lock:
+            curricula = [
+                curriculum
+                for curriculum in self.curricula.values()
+                if search.lower() in curriculum.name.lower()
+            ]
+        sort_keys: List[Callable[[FakeCurriculum], Any]] = [
+            lambda curriculum: curriculum.name,
+            lambda curriculum: curriculum.organization_id,
+            lambda curriculum: curriculum.cip_code,
+            lambda curriculum: curriculum.year,
+            lambda curriculum: curriculum.created,
+        ]
+        curricula.sort(key=sort_keys[column], reverse=descending)
+        return curricula[start : start + length]
+
+    def plans_of(self, curriculum_id: int) -> List[FakeDegreePlan]:
+        with self._lock:
+            return [
+                plan
+                for plan in self.degree_plans.values()
+                if plan.curriculum_id == curriculum_id
+            ]
+
+    def edit_curriculum(self, curriculum_id: int, **changes: Any) -> None:
+        with self._lock:
+            self.curricula[curriculum_id] = self.curricula[curriculum_id]._replace(
+                **changes
+            )
+
+    def edit_degree_plan(self, plan_id: int, data: Any) -> None:
+        with self._lock:
+            self.degree_plans[plan_id] = self.degree_plans[plan_id]._replace(data=data)
+
+    def destroy_curriculum(self, curriculum_id: int) -> None:
+        with self._lock:
+            del self.curricula[curriculum_id]
+            for plan_id, plan in list(self.degree_plans.items()):
+                if plan.curriculum_id == curriculum_id:
+                    del self.degree_plans[plan_id]
+
+    def destroy_degree_plan(self, plan_id: int) -> None:
+        with self._lock:
+            del self.degree_plans[plan_id]
+
+
+def parse_form(content_type: str, body: bytes) -> Dict[str, str]:
+    """
+    Parses a `multipart/form-data` or `application/x-www-form-urlencoded`
+    request body. Files are decoded as UTF-8 text.
+    """
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+        )
+        form: Dict[str, str] = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            if isinstance(name, str) and isinstance(payload, bytes):
+                # `Blob.write_line` ends every value with a line break
+                form[name] = payload.decode("utf-8").removesuffix("\r\n")
+        return form
+    return {
+        name: values[0]
+        for name, values in parse_qs(
+            body.decode("utf-8"), keep_blank_values=True
+        ).items()
+    }
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    # Keep-alive needs HTTP/1.1
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _reply(
+        self,
+        status: int,
+        body: bytes = b"",
+        content_type: str = "text/html; charset=utf-8",
+        location: Optional[str] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if location is not None:
+            self.send_header("Location", location)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, data: Any) -> None:
+        self._reply(200, json.dumps(data).encode("utf-8"), "application/json")
+
+    def _handle(self, method: str) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        server = cast(_Server, self.server)
+        state = server.state
+        state.count_request()
+        if server.latency > 0:
+            time.sleep(server.latency)
+        if random.random() < server.error_rate:
+            self._reply(503, b"Service Unavailable")
+            return
+
+        url = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        cookie = self.headers.get("Cookie") or ""
+        signed_in = re.search(r"_curricularanalytics_session=[^;\s]+", cookie)
+        form: Dict[str, str] = {}
+        if method == "POST":
+            form = parse_form(self.headers.get("Content-Type") or "", body)
+            method = form.get("_method", "post").upper()
+            if not signed_in:
+                self._reply(302, location="/users/sign_in")
+                return
+            if form.get("authenticity_token") != CSRF_TOKEN:
+                self._reply(422, b"Invalid authenticity token")
+                return
+        elif not signed_in:
+            self._reply(401, b"Unauthorized")
+            return
+        elif method == "PATCH" and self.headers.get("X-CSRF-Token") != CSRF_TOKEN:
+            self._reply(422, b"Invalid authenticity token")
+            return
+
+        try:
+            self._route(method, url.path, query, form, body)
+        except KeyError:
+            self._reply(404, b"Not Found")
+
+    def _route(
+        self,
+        method: str,
+        path: str,
+        query: Dict[str, str],
+        form: Dict[str, str],
+        body: bytes,
+    ) -> None:
+        state = cast(_Server, self.server).state
+        match: Optional[re.Match[str]]
+        if method == "GET" and path == "/degree_plans":
+            self._reply(
+                200,
+                f'<meta name="csrf-token" content="{CSRF_TOKEN}" />'.encode("utf-8"),
+            )
+        elif method == "POST" and path == "/curricula":
+            state.add_curriculum(
+                form["curriculum[name]"],
+                int(form["curriculum[organization_id]"]),
+                form.get("curriculum[cip]", ""),
+                int(form["curriculum[catalog_year]"]),
+                _form_data(form, "curriculum[curriculum_file]"),
+            )
+            self._reply(302, location="/curricula")
+        elif method == "POST" and path == "/degree_plans":
+            state.add_degree_plan(
+                form["degree_plan[name]"],
+                int(form["degree_plan[curriculum_id]"]),
+                _form_data(form, "degree_plan[degree_plan_file]"),
+            )
+            self._reply(302, location="/degree_plans")
+        elif method == "GET" and path == "/curricula":
+            curricula = state.list_curricula(
+                int(query.get("order[0][column]", 0)),
+                query.get("order[0][dir]") == "desc",
+                int(query.get("start", 0)),
+                int(query.get("length", 10)),
+                query.get("search[value]", ""),
+            )
+            self._json(
+                {
+                    "data": [
+                        [
+                            f'<a href="/curricula/{curriculum.curriculum_id}">{escape(curriculum.name)}</a>',
+                            f'<a href="/organizations/{curriculum.organization_id}">Organization</a>',
+                            curriculum.cip_code,
+                            curriculum.year,
+                            f"created {curriculum.created}",
+                            "",
+                        ]
+                        for curriculum in curricula
+                    ]
+                }
+            )
+        elif match := re.fullmatch(r"/curricula/(\d+)/graph", path):
+            curriculum_id = int(match.group(1))
+            if method == "GET":
+                plans = state.plans_of(curriculum_id)
+                self._reply(
+                    200,
+                    "".join(
+                        f'<a href="/degree_plans/{plan.plan_id}">{escape(plan.name)}</a>\n'
+                        for plan in plans
+                    ).encode("utf-8"),
+                )
+            elif method == "PATCH":
+                changes: Dict[str, Any] = {}
+                if "curriculum[name]" in form:
+                    changes["name"] = form["curriculum[name]"]
+                if "curriculum[cip]" in form:
+                    changes["cip_code"] = form["curriculum[cip]"]
+                if "curriculum[organization_id]" in form:
+                    changes["organization_id"] = int(
+                        form["curriculum[organization_id]"]
+                    )
+                if "curriculum[catalog_year]" in form:
+                    changes["year"] = int(form["curriculum[catalog_year]"])
+                state.edit_curriculum(curriculum_id, **changes)
+                self._reply(302, location=f"/curricula/{curriculum_id}")
+            elif method == "DELETE":
+                state.destroy_curriculum(curriculum_id)
+                self._reply(302, location="/curricula")
+            else:
+                raise KeyError(method)
+        elif method == "DELETE" and (
+            match := re.fullmatch(r"/degree_plans/(\d+)", path)
+        ):
+            state.destroy_degree_plan(int(match.group(1)))
+            self._reply(302, location="/degree_plans")
+        elif method == "PATCH" and (
+            match := re.fullmatch(r"/(curricula|degree_plans)/viz_update/(\d+)", path)
+        ):
+            data = json.loads(body)
+            if match.group(1) == "curricula":
+                state.edit_curriculum(int(match.group(2)), data=data)
+            else:
+                state.edit_degree_plan(int(match.group(2)), data)
+            self._json({})
+        elif method == "GET" and (
+            match := re.fullmatch(r"/vis_curriculum_hash/(\d+)", path)
+        ):
+            self._json(state.curricula[int(match.group(1))].data)
+        elif method == "GET" and (
+            match := re.fullmatch(r"/vis_degree_plan_hash/(\d+)", path)
+        ):
+            self._json(state.degree_plans[int(match.group(1))].data)
+        else:
+            raise KeyError(path)
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+
+def _form_data(form: Dict[str, str], file_field: str) -> Any:
+    """
+    Gets the uploaded CSV file, or the JSON if uploaded from the GUI.
+    """
+    if form.get("entry_method") == "gui":
+        return json.loads(form["curriculum_json"])
+    return form[file_field]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    state: FakeState
+    latency: float
+    error_rate: float
+
+
+class FakeServer:
+    """
+    Serves the fake website on `host` until `stop` is called. Can also be used
+    in a `with` statement.
+
+    ```py
+    with FakeServer(latency=0.1) as server:
+        session = Session("cookie", host=server.host)
+        ...
+    print(server.state.requests)
+    ```
+    """
+
+    state: FakeState
+    _server: _Server
+    _thread: Thread
+
+    def __init__(
+        self, port: int = 0, latency: float = 0, error_rate: float = 0
+    ) -> None:
+        """
+        `port` 0 picks any free port. `latency` is how many seconds each
+        request takes, and `error_rate` is the fraction of requests that fail
+        with a 503.
+        """
+        self.state = FakeState()
+        self._server = _Server(("127.0.0.1", port), FakeHandler)
+        self._server.state = self.state
+        self._server.latency = latency
+        self._server.error_rate = error_rate
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def host(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def join(self) -> None:
+        """
+        Waits until the server is stopped.
+        """
+        self._thread.join()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeServer":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="Run a local stand-in for the Curricular Analytics website."
+    )
+    parser.add_argument("--port", type=int, default=8000, help="Default: 8000")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Seconds to wait before responding to each request. Default: 0",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests to fail with a 503. Default: 0",
+    )
+    args = parser.parse_args()
+    server = FakeServer(args.port, args.latency, args.error_rate)
+    print(f"Listening on {server.host}")
+    try:
+        server.join()
+    except KeyboardInterrupt:
+        server.stop()
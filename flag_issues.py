@@ -1,13 +1,23 @@
 """
+Flags likely mistakes in the academic plans for advisors to look at.
+
+The plans of each college are checked in their own job, and each issue is
+recorded as an `Issue`. The HTML report is rendered from the issues, and
+`--format csv` or `--format json` writes the issues themselves instead (JSON
+Lines, one issue per line), which works for any number of years.
+
 python3 units_per_course.py json > units_per_course.json
 python3 flag_issues.py 2024 > files/flagged_issues.html
+python3 flag_issues.py --all-years --format csv --jobs 4 > files/flagged_issues.csv
 """
 
 import json
-from typing import Dict, List, Set
-from parse import major_plans, prereqs
+import sys
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
+from parse import load_all_plans, major_plans, plan_term_prereqs
 from parse_defs import CourseCode, ProcessedCourse
 from university import university
+from util import CsvWriter, map_jobs
 
 GES = {
     "RE": [
@@ -81,6 +91,38 @@ with open("./units_per_course.json") as file:
     }
 
 
+SECTIONS = [
+    ("missing_major", "Missing plans"),
+    ("wrong_units", "Wrong unit numbers"),
+    ("missing_prereqs", "Missing prerequisites"),
+    (
+        "miscategorized_courses",
+        "College GE courses marked as major/department courses",
+    ),
+    ("missing_ges", "Missing college GE"),
+    ("duplicate_courses", "Duplicate courses"),
+    ("dne", "Nonexistent courses"),
+    ("early_upper_division", "Upper division courses taken before junior year"),
+    ("multiple_options", "Courses with multiple options listed multiple times"),
+    (
+        "curriculum_deviances",
+        "Course names marked as for the major not present in other colleges' curricula",
+    ),
+]
+"""
+The kinds of issues, which are the names of the lists in `Issues`, and their
+headings in the HTML report, in the order they're listed.
+"""
+
+
+class Issue(NamedTuple):
+    year: int
+    college: str
+    major: str
+    kind: str
+    message: str
+
+
 class Issues:
     multiple_options: List[str]
     duplicate_courses: List[str]
@@ -105,6 +147,11 @@ class Issues:
         self.dne = []
         self.missing_major = []
 
+    def records(self, year: int, college: str, major: str) -> Iterator[Issue]:
+        for kind, _ in SECTIONS:
+            for message in getattr(self, kind):
+                yield Issue(year, college, major, kind, message)
+
 
 def check_plan(
     year: int,
@@ -116,8 +163,11 @@ def check_plan(
 ) -> None:
     course_codes = [course.course_code for course in plan if course.course_code]
     courses = {course.course_code: course for course in plan if course.course_code}
-    for i, code in enumerate(course_codes):
-        if code in course_codes[0:i]:
+    seen: Set[CourseCode] = set()
+    for code in course_codes:
+        if code not in seen:
+            seen.add(code)
+        else:
             title = courses[code].raw.course_title
             if any(char in title for char in ["/", "or", "OR", "-"]):
                 issues.multiple_options.append(
@@ -127,6 +177,16 @@ def check_plan(
                 issues.duplicate_courses.append(
                     f"[{name}] duplicate course {code} “{title}”"
                 )
+    # The courses taken in each term, and the courses taken before each term
+    taking: Dict[int, Set[CourseCode]] = {}
+    for course in plan:
+        if course.course_code:
+            taking.setdefault(course.term_index, set()).add(course.course_code)
+    taken: Dict[int, Set[CourseCode]] = {}
+    so_far: Set[CourseCode] = set()
+    for term_index in sorted(taking.keys()):
+        taken[term_index] = so_far.copy()
+        so_far |= taking[term_index]
     for code in GES[college]:
         # Hack for PHIL/POLI commutativity
         if code.subject == "POLI" and code not in course_codes:
@@ -174,9 +234,7 @@ def check_plan(
                 f"[{name}] “{course.raw.course_title}” is taken in year {course.term_index // 3 + 1} {quarter} quarter"
             )
         if course.course_code and course.course_code not in ASSUMED_SATISFIED:
-            reqs = prereqs(university.get_term_code(year, course.term_index)).get(
-                course.course_code
-            )
+            reqs = plan_term_prereqs(year, course.term_index).get(course.course_code)
             if reqs is None:
                 # Eighth CCE courses don't exist yet
                 if course.course_code.subject != "CCE":
@@ -184,26 +242,14 @@ def check_plan(
                         f"[{name}] {course.course_code} (from “{course.raw.course_title}”) does not exist"
                     )
             else:
-                taken = [
-                    past_course.course_code
-                    for past_course in plan
-                    if past_course.course_code
-                    and past_course.term_index < course.term_index
-                ]
-                taking = [
-                    curr_course.course_code
-                    for curr_course in plan
-                    if curr_course.course_code
-                    and curr_course.term_index == course.term_index
-                ]
                 for req in reqs:
                     if not req:
                         continue
                     for alt in req:
                         if (
-                            alt.course_code in taken
+                            alt.course_code in taken[course.term_index]
                             or alt.allow_concurrent
-                            and alt.course_code in taking
+                            and alt.course_code in taking[course.term_index]
                         ):
                             break
                     else:
@@ -222,14 +268,21 @@ def print_issues(issues: List[str], description: str) -> None:
     print()
 
 
-def main(year: int, length: int = 4) -> None:
-    for college_code, college_name in university.college_names.items():
-        issues = Issues()
-        for major_code, plans in major_plans(year, length).items():
-            if college_code not in plans.colleges:
-                if not major_code.startswith("UN"):
-                    issues.missing_major.append(f"Missing plan for major {major_code}")
-                continue
+def check_college(job: Tuple[int, int, str]) -> List[Issue]:
+    """
+    Checks every major's plan for a college. Runs in a worker process if there
+    are multiple jobs.
+    """
+    year, length, college_code = job
+    issues: List[Issue] = []
+    for major_code, plans in major_plans(year, length).items():
+        major_issues = Issues()
+        if college_code not in plans.colleges:
+            if not major_code.startswith("UN"):
+                major_issues.missing_major.append(
+                    f"Missing plan for major {major_code}"
+                )
+        else:
             curriculum = {course.course_title for course in plans.curriculum()}
             check_plan(
                 year,
@@ -237,41 +290,95 @@ def main(year: int, length: int = 4) -> None:
                 curriculum,
                 plans.plan(college_code),
                 college_code,
-                issues,
+                major_issues,
             )
+        issues.extend(major_issues.records(year, college_code, major_code))
+    return issues
 
-        print(f"<h1>{college_name}</h1>")
-        print_issues(issues.missing_major, "Missing plans")
-        print_issues(issues.wrong_units, "Wrong unit numbers")
-        print_issues(issues.missing_prereqs, "Missing prerequisites")
-        print_issues(
-            issues.miscategorized_courses,
-            "College GE courses marked as major/department courses",
-        )
-        print_issues(issues.missing_ges, "Missing college GE")
-        print_issues(issues.duplicate_courses, "Duplicate courses")
-        print_issues(
-            issues.dne,
-            "Nonexistent courses",
-        )
-        print_issues(
-            issues.early_upper_division,
-            "Upper division courses taken before junior year",
-        )
-        print_issues(
-            issues.multiple_options,
-            "Courses with multiple options listed multiple times",
-        )
-        print_issues(
-            issues.curriculum_deviances,
-            "Course names marked as for the major not present in other colleges' curricula",
+
+def check_all(
+    years: List[int], length: int = 4, jobs: int = 1
+) -> List[Tuple[int, str, List[Issue]]]:
+    """
+    Lists each year and college with the issues in their plans, in order of
+    year, then college. Every check finishes before this returns, so the worker
+    processes are shut down before anything is printed.
+    """
+    checks = [
+        (year, length, college_code)
+        for year in years
+        for college_code in university.college_names.keys()
+    ]
+    with map_jobs(check_college, checks, jobs) as results:
+        return [
+            (year, college_code, issues)
+            for (year, _, college_code), issues in zip(checks, results)
+        ]
+
+
+def print_html(
+    results: Iterable[Tuple[int, str, List[Issue]]], show_year: bool = False
+) -> None:
+    print("<style>p { margin: 0; white-space: pre-wrap; }</style>")
+    for year, college_code, issues in results:
+        college_name = university.college_names[college_code]
+        print(
+            f"<h1>{college_name} ({year})</h1>"
+            if show_year
+            else f"<h1>{college_name}</h1>"
         )
+        for kind, description in SECTIONS:
+            print_issues(
+                [issue.message for issue in issues if issue.kind == kind],
+                description,
+            )
+
+
+def print_csv(results: Iterable[Tuple[int, str, List[Issue]]]) -> None:
+    writer = CsvWriter(len(Issue._fields), sys.stdout)
+    writer.row(*Issue._fields)
+    for _, _, issues in results:
+        for issue in issues:
+            writer.row(str(issue.year), *issue[1:])
+
+
+def print_json(results: Iterable[Tuple[int, str, List[Issue]]]) -> None:
+    for _, _, issues in results:
+        for issue in issues:
+            print(json.dumps(issue._asdict()))
 
 
 if __name__ == "__main__":
-    import sys
+    from argparse import ArgumentParser
 
-    if len(sys.argv) < 2:
-        raise ValueError("Need year: python3 courses_req_by_majors.py <year>")
-    print("<style>p { margin: 0; white-space: pre-wrap; }</style>")
-    main(int(sys.argv[1]))
+    parser = ArgumentParser(description="Flag likely mistakes in academic plans.")
+    parser.add_argument("years", type=int, nargs="*", help="Plan years to check.")
+    parser.add_argument(
+        "--all-years", action="store_true", help="Check every plan year."
+    )
+    parser.add_argument("--length", type=int, default=4, help="Plan length. Default: 4")
+    parser.add_argument(
+        "--format",
+        choices=["html", "csv", "json"],
+        default="html",
+        help="html for the report, or csv or json (JSON Lines) for a list of issues. Default: html",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes to check colleges' plans in. Default: 1",
+    )
+    args = parser.parse_args()
+    years: List[int] = (
+        load_all_plans().years(args.length) if args.all_years else args.years
+    )
+    if not years:
+        parser.error("Need year: python3 flag_issues.py <year>")
+    results = check_all(years, args.length, args.jobs)
+    if args.format == "html":
+        print_html(results, len(years) > 1)
+    elif args.format == "csv":
+        print_csv(results)
+    else:
+        print_json(results)
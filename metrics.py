@@ -0,0 +1,422 @@
+"""
+Computes Curricular Analytics' course metrics for every course in a curriculum
+or degree plan at once using NumPy arrays, rather than building a
+`curricularanalytics.Curriculum` and asking for each course's metrics one at a
+time, which walks the whole graph again for every course.
+
+The metrics match `curricularanalytics` 0.2.0 for the degree plans made by
+`MajorOutput.output_degree_plan`:
+
+- The **blocking factor** is the number of courses reachable from a course.
+- The **delay factor** is the number of courses in the longest path through a
+  course.
+- The **centrality** is the total length of every source-to-sink path that
+  passes through a course without starting or ending at it.
+- The **complexity** is the sum of the delay and blocking factors.
+  `output_degree_plan` uses the default semester system, so the quarter system
+  scaling doesn't apply.
+
+Exports:
+    `PlanGraph` and `plan_graph`, the requisite graph of a curriculum or degree
+    plan as an adjacency matrix.
+
+    `CourseMetrics` and `course_metrics`, which compute the metrics from an
+    adjacency matrix.
+
+    `PlanMetrics`, `metrics_for_graph`, `metrics_for_major`, and
+    `metrics_for_plans`, which compute the plan-wide metrics `plan_metrics.py`
+    needs for a plan, a major's plans, or a year's plans.
+
+python3 metrics.py # Check against curricularanalytics for every plan
+"""
+
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from output import MajorOutput, OutputCourse
+from parse import MajorPlans, load_all_plans, major_plans
+from university import university
+
+__all__ = [
+    "PlanGraph",
+    "plan_graph",
+    "topological_levels",
+    "CourseMetrics",
+    "course_metrics",
+    "PlanMetrics",
+    "metrics_for_graph",
+    "metrics_for_major",
+    "metrics_for_plans",
+]
+
+
+class PlanGraph(NamedTuple):
+    """
+    `adjacency[i, j]` is true if `courses[i]` is a prerequisite or corequisite
+    of `courses[j]`, and `corequisites[i, j]` if it's a corequisite.
+    `vertices` maps course IDs to the index of the first course with the ID.
+    """
+
+    courses: List[OutputCourse]
+    adjacency: NDArray[np.bool_]
+    corequisites: NDArray[np.bool_]
+    vertices: Dict[int, int]
+
+    def requisites(self, course: int) -> List[int]:
+        """
+        The course's requisites in the order `curricularanalytics` adds them
+        to its graph.
+        """
+        req_ids = self.courses[course].prereq_ids + self.courses[course].coreq_ids
+        return [self.vertices[req_id] for req_id in dict.fromkeys(req_ids)]
+
+
+def plan_graph(output: MajorOutput, college: Optional[str] = None) -> PlanGraph:
+    """
+    Gets the requisite graph of the degree plan that
+    `output.output_degree_plan(college)` would create.
+    """
+    courses = list(output.resolve(college).courses)
+    # Like `curricularanalytics`, requisites refer to the first course with
+    # the ID
+    vertices: Dict[int, int] = {}
+    for i, course in enumerate(courses):
+        vertices.setdefault(course.course_id, i)
+    adjacency = np.zeros((len(courses), len(courses)), dtype=np.bool_)
+    corequisites = np.zeros((len(courses), len(courses)), dtype=np.bool_)
+    for i, course in enumerate(courses):
+        for req_id in course.prereq_ids:
+            adjacency[vertices[req_id], i] = True
+        for req_id in course.coreq_ids:
+            adjacency[vertices[req_id], i] = True
+            corequisites[vertices[req_id], i] = True
+    return PlanGraph(courses, adjacency, corequisites, vertices)
+
+
+def topological_levels(adjacency: NDArray[np.bool_]) -> List[NDArray[np.intp]]:
+    """
+    Groups vertices by the number of vertices in the longest path ending at
+    them, so every edge goes from an earlier level to a later one. Raises
+    `ValueError` if the graph has a cycle.
+    """
+    in_degrees = adjacency.sum(axis=0)
+    remaining = np.ones(len(adjacency), dtype=np.bool_)
+    levels: List[NDArray[np.intp]] = []
+    while remaining.any():
+        level = np.flatnonzero(remaining & (in_degrees == 0))
+        if len(level) == 0:
+            raise ValueError("The requisite graph has a cycle.")
+        levels.append(level)
+        remaining[level] = False
+        in_degrees -= adjacency[level].sum(axis=0)
+    return levels
+
+
+class CourseMetrics(NamedTuple):
+    """
+    Metrics for each vertex, in the same order as the adjacency matrix.
+
+    `depth` is the number of vertices in the longest path ending at each vertex,
+    and `reachable[i, j]` is true if there's a path from vertex `i` to `j`.
+    """
+
+    complexity: NDArray[np.float64]
+    centrality: NDArray[np.int64]
+    blocking_factor: NDArray[np.int64]
+    delay_factor: NDArray[np.int64]
+    depth: NDArray[np.int64]
+    reachable: NDArray[np.bool_]
+
+
+def _path_dp(
+    adjacency: NDArray[np.bool_], levels: List[NDArray[np.intp]]
+) -> Tuple[NDArray[np.int64], NDArray[np.int64], NDArray[np.int64]]:
+    """
+    For the paths that start at a source and end at each vertex, returns the
+    number of vertices in the longest one, the number of them, and their total
+    number of vertices. `levels` must list every edge's start before its end;
+    each level is processed at once.
+    """
+    edges = adjacency.astype(np.int64)
+    sources = (~adjacency.any(axis=0)).astype(np.int64)
+    longest = np.zeros(len(adjacency), dtype=np.int64)
+    counts = np.zeros(len(adjacency), dtype=np.int64)
+    lengths = np.zeros(len(adjacency), dtype=np.int64)
+    for level in levels:
+        into: NDArray[np.int64] = edges[:, level]
+        longest[level] = (into * longest[:, None]).max(axis=0) + 1
+        counts[level] = counts @ into + sources[level]
+        lengths[level] = (lengths + counts) @ into + sources[level]
+    return longest, counts, lengths
+
+
+def course_metrics(adjacency: NDArray[np.bool_]) -> CourseMetrics:
+    """
+    Computes the metrics of every vertex of an acyclic requisite graph.
+    """
+    if len(adjacency) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return CourseMetrics(
+            empty.astype(np.float64), empty, empty, empty, empty, adjacency.copy()
+        )
+    levels = topological_levels(adjacency)
+
+    # Paths from sources to each vertex, and (on the reversed graph) from each
+    # vertex to sinks
+    up, from_sources, from_sources_length = _path_dp(adjacency, levels)
+    down, to_sinks, to_sinks_length = _path_dp(adjacency.T, levels[::-1])
+    delay_factor = up + down - 1
+
+    # Centrality: every path from a source to the vertex can be joined with
+    # every path from the vertex to a sink, and the vertex is counted twice
+    interior = adjacency.any(axis=0) & adjacency.any(axis=1)
+    centrality = np.where(
+        interior,
+        from_sources_length * to_sinks
+        + from_sources * to_sinks_length
+        - from_sources * to_sinks,
+        0,
+    )
+
+    # Blocking factor: descendants of later levels are known by the time an
+    # earlier level is processed
+    edges = adjacency.astype(np.int64)
+    reachable = np.zeros_like(adjacency)
+    for level in levels[::-1]:
+        reachable[level] = adjacency[level] | (edges[level] @ reachable > 0)
+    blocking_factor = reachable.sum(axis=1).astype(np.int64)
+
+    return CourseMetrics(
+        (delay_factor + blocking_factor).astype(np.float64),
+        centrality,
+        blocking_factor,
+        delay_factor,
+        up,
+        reachable,
+    )
+
+
+class PlanMetrics(NamedTuple):
+    """
+    The metrics `plan_metrics.py` reports for a degree plan. Courses are
+    referred to by their index in `graph.courses`, and ties are broken the same
+    way as `curricularanalytics` does.
+
+    `redundant_reqs` lists (prereq, course) pairs in the order that iterating
+    over `Curriculum.extraneous_requisites()` would.
+    """
+
+    graph: PlanGraph
+    course_metrics: CourseMetrics
+    total_complexity: float
+    longest_path: List[int]
+    max_complexity_course: int
+    max_centrality_course: int
+    term_units: List[float]
+    redundant_reqs: List[Tuple[int, int]]
+
+
+def _longest_path(graph: PlanGraph, depth: NDArray[np.int64]) -> List[int]:
+    """
+    `curricularanalytics` lists paths by sink, then breadth-first from the
+    sink backwards, so its first longest path ends at the first sink with the
+    longest path and follows the first requisite that's on a longest path.
+    """
+    has_prereqs = graph.adjacency.any(axis=0)
+    sinks = np.flatnonzero(has_prereqs & ~graph.adjacency.any(axis=1))
+    if len(sinks) == 0:
+        return []
+    course = int(sinks[np.argmax(depth[sinks])])
+    path = [course]
+    while depth[course] > 1:
+        course = next(
+            req for req in graph.requisites(course) if depth[req] == depth[course] - 1
+        )
+        path.insert(0, course)
+    return path
+
+
+def _redundant_reqs(
+    graph: PlanGraph, redundant: NDArray[np.bool_]
+) -> List[Tuple[int, int]]:
+    """
+    `Curriculum.extraneous_requisites` returns a set, so the order the pairs
+    are listed in depends on the order they were added. This follows the same
+    order: by weakly connected component, then breadth-first from each course.
+    """
+    if not redundant.any():
+        return []
+    ids = [course.course_id for course in graph.courses]
+    successors: List[List[int]] = [
+        np.flatnonzero(row).tolist() for row in graph.adjacency
+    ]
+    predecessors = [graph.requisites(i) for i in range(len(graph.courses))]
+    pairs: Set[Tuple[int, int]] = set()
+    seen: Set[int] = set()
+    for start in range(len(graph.courses)):
+        if start in seen:
+            continue
+        # Same as networkx's `weakly_connected_components`, including the
+        # order vertices are added to the set
+        component = {start}
+        next_level: List[int] = [start]
+        while next_level:
+            level = next_level
+            next_level = []
+            for vertex in level:
+                for neighbor in successors[vertex] + predecessors[vertex]:
+                    if neighbor not in component:
+                        component.add(neighbor)
+                        next_level.append(neighbor)
+        seen |= component
+        if len(component) <= 1:
+            continue
+        for prereq in component:
+            if not redundant[prereq].any():
+                continue
+            visited = set(successors[prereq])
+            queue = deque(successors[prereq])
+            found: Dict[int, None] = {}
+            while queue:
+                vertex = queue.popleft()
+                for course in successors[vertex]:
+                    found[course] = None
+                    if course not in visited:
+                        visited.add(course)
+                        queue.append(course)
+            for course in found:
+                # `extraneous_requisites` checks whether the pair of vertex
+                # indices is in the set before adding the pair of course IDs,
+                # so it skips pairs whose indices match an existing ID pair
+                if redundant[prereq, course] and (prereq, course) not in pairs:
+                    pairs.add((ids[prereq], ids[course]))
+    return [
+        (graph.vertices[prereq], graph.vertices[course]) for prereq, course in pairs
+    ]
+
+
+def metrics_for_graph(graph: PlanGraph) -> PlanMetrics:
+    """
+    Computes the metrics `plan_metrics.py` reports for a degree plan.
+    """
+    metrics = course_metrics(graph.adjacency)
+
+    # A requisite is redundant if the course can also be reached through
+    # another path, unless the prereq is a corequisite of a course on the way
+    # (or of the course itself)
+    edges = graph.adjacency.astype(np.int64)
+    reachable = metrics.reachable.astype(np.int64)
+    corequisites = graph.corequisites.astype(np.int64)
+    reachable_or_self = reachable + np.eye(len(reachable), dtype=np.int64)
+    redundant = (
+        graph.adjacency
+        & (edges @ reachable > 0)
+        & ~(corequisites @ reachable_or_self > 0)
+    )
+
+    terms = np.array([course.term for course in graph.courses], dtype=np.int64)
+    units = np.array([course.units for course in graph.courses])
+    return PlanMetrics(
+        graph,
+        metrics,
+        float(metrics.complexity.sum()),
+        _longest_path(graph, metrics.depth),
+        int(np.argmax(metrics.complexity)),
+        int(np.argmax(metrics.centrality)),
+        np.bincount(terms, weights=units).tolist(),
+        _redundant_reqs(graph, redundant),
+    )
+
+
+def metrics_for_major(plans: MajorPlans) -> Dict[str, PlanMetrics]:
+    """
+    Computes the metrics of every college's degree plan of a major, keyed by
+    college.
+    """
+    output = MajorOutput(plans)
+    return {
+        college: metrics_for_graph(plan_graph(output, college))
+        for college in university.college_codes
+        if college in plans.colleges
+    }
+
+
+def metrics_for_plans(year: int) -> Dict[Tuple[str, str], PlanMetrics]:
+    """
+    Computes the metrics of every college's degree plan of every major for a
+    year, keyed by major and college.
+    """
+    return {
+        (major, college): metrics
+        for major, plans in major_plans(year).items()
+        for college, metrics in metrics_for_major(plans).items()
+    }
+
+
+def _check_plan(output: MajorOutput, college: Optional[str] = None) -> None:
+    """
+    Asserts that the metrics match those from `curricularanalytics`.
+    """
+    curriculum = output.output_degree_plan(college).curriculum
+    metrics = course_metrics(plan_graph(output, college).adjacency)
+    for i, course in enumerate(curriculum.courses):
+        expected = (
+            curriculum.complexity(course),
+            curriculum.centrality(course),
+            curriculum.blocking_factor(course),
+            curriculum.delay_factor(course),
+        )
+        actual = tuple(metric[i] for metric in metrics[:4])
+        assert actual == expected, f"{course.name}: {actual} != {expected}"
+
+
+def _check_year(year: int) -> None:
+    """
+    Asserts that the plan-wide metrics match those from `curricularanalytics`.
+    """
+    for (major, college), metrics in metrics_for_plans(year).items():
+        degree_plan = MajorOutput(major_plans(year)[major]).output_degree_plan(college)
+        curriculum = degree_plan.curriculum
+        names = [course.course_title for course in metrics.graph.courses]
+        longest_path = curriculum.longest_paths[0] if curriculum.longest_paths else []
+        expected = (
+            curriculum.total_complexity,
+            [course.name for course in longest_path],
+            curriculum.basic_metrics.max_complexity_courses[0].name,
+            curriculum.basic_metrics.max_centrality_courses[0].name,
+            [term.credit_hours for term in degree_plan.terms],
+            [
+                (
+                    curriculum.course_from_id(prereq).name,
+                    curriculum.course_from_id(course).name,
+                )
+                for prereq, course in curriculum.extraneous_requisites()
+            ],
+        )
+        actual = (
+            metrics.total_complexity,
+            [names[i] for i in metrics.longest_path],
+            names[metrics.max_complexity_course],
+            names[metrics.max_centrality_course],
+            metrics.term_units,
+            [
+                (names[prereq], names[course])
+                for prereq, course in metrics.redundant_reqs
+            ],
+        )
+        assert actual == expected, f"{major} {college}: {actual} != {expected}"
+
+
+if __name__ == "__main__":
+    for year, majors in load_all_plans().by_year():
+        for major, plans in majors.items():
+            output = MajorOutput(plans)
+            _check_plan(output)
+            for college in university.college_codes:
+                if college in plans.colleges:
+                    _check_plan(output, college)
+        _check_year(year)
+        print(f"{year} OK")
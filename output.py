@@ -5,19 +5,25 @@ from the parsed academic plans and course prerequisites.
 Exports:
     `MajorOutput`, a class capable of producing degree plans or a curriculum for
     a particular major in Curricular Analytics' CSV and JSON formats.
+
+    `ResolvedPlan`, a degree plan or curriculum with course IDs and
+    prerequisites assigned, which `MajorOutput.resolve` caches so every format
+    is output from the same work.
 """
 
-from typing import Dict, Generator, List, NamedTuple, Optional, Set
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import curricularanalytics as ca
 import output_json as obj
 
-from parse import MajorPlans, major_codes, prereqs
+from parse import MajorPlans, major_codes, plan_term_prereqs
 from parse_defs import CourseCode, Prerequisite, ProcessedCourse
 from university import university
 from util import CsvWriter
 
-__all__ = ["MajorOutput"]
+__all__ = ["MajorOutput", "OutputCourse", "ResolvedPlan"]
 
 HEADER = [
     "Course ID",
@@ -38,7 +44,7 @@ DEGREE_PLAN_COLS = 11
 
 class OutputCourse(NamedTuple):
     """
-    A course output by `OutputCourses`. This contains all the fields necessary
+    A course in a `ResolvedPlan`. This contains all the fields necessary
     for a course row in a curriculum/degree plan CSV file. This helps reduce
     code repetition between outputting a curriculum vs. a degree plan and a CSV
     vs. JSON file, which each have many similarities.
@@ -53,60 +59,62 @@ class OutputCourse(NamedTuple):
     term: int
 
 
-class OutputCourses:
+class ResolvedPlan(NamedTuple):
+    """
+    A curriculum or degree plan with course IDs, numbered duplicate titles, and
+    prerequisites resolved, ready to be output in any format. Get one from
+    `MajorOutput.resolve`, which only resolves each plan once.
+
+    `courses` lists every course chronologically, which is what
+    `output_degree_plan` uses. `major_courses` and `college_courses` are for
+    formats that put college courses under "Additional Courses" in degree
+    plans. Courses that don't have a curriculum course ID, such as "GE" or a
+    duplicate course, are numbered in the order they're listed, so their IDs and
+    titles in the two orderings can differ.
+
+    The plan is shared by everything that outputs it, so don't modify it,
+    including the requisite lists of its courses.
     """
-    Lists courses in a ready-to-go format for creating a CSV or JSON file.
 
-    Why not return a list directly? This intermediate class allows courses to be
-    separated based on whether they're a major or college course because degree
-    plan CSVs specifically have a separate section for "Additional Courses."
-    Maybe I could've instead output a tuple or something depending on what is
-    needed, but in Python it seems easier to me to loop over a list again and
-    only yield what is necessary rather than partition a list beforehand.
+    courses: Tuple[OutputCourse, ...]
+    major_courses: Tuple[OutputCourse, ...]
+    college_courses: Tuple[OutputCourse, ...]
 
-    `start_id` is the next unassigned ID that can be assigned to additional
-    courses.
 
-    `course_ids` is a *clone* of that from `MajorOutput` because degree plan
-    additional courses do not share course IDs between each other on Curricular
-    Analytics.
+class _PrereqFinder:
     """
+    Finds the course IDs of the prerequisites of courses in a plan.
 
-    processed_courses: List[ProcessedCourse]
-    current_id: int
-    course_ids: Dict[CourseCode, int]
-    duplicate_titles: Dict[str, int]
-    claimed_ids: Set[CourseCode]
-    year: int
-
-    def __init__(self, parent: "MajorOutput", college: Optional[str]) -> None:
-        self.processed_courses = (
-            parent.plans.plan(college) if college else parent.curriculum
-        )
-        self.year = parent.plans.year
-
-        # 3. Assign course IDs
-        self.current_id = parent.start_id
-        self.course_ids = {**parent.course_ids}
-        for course in self.processed_courses:
-            if course.course_code and course.course_code not in self.course_ids:
-                self.course_ids[course.course_code] = self.current_id
-                self.current_id += 1
+    `_codes`, `_first_index`, and `_max_terms` index the courses with course
+    codes in the plan for `find`: `_codes[i]` is the *i*th such course's code,
+    `_first_index` maps each code to the index of its first course, and
+    `_max_terms[i]` is the latest term index of the first *i* + 1 courses.
+    """
 
-        # Get duplicate course titles so can start with "GE 1" and so on
-        course_titles = [course.course_title for course in self.processed_courses]
-        self.duplicate_titles = {
-            title: 0
-            for i, title in enumerate(course_titles)
-            if title in course_titles[0:i]
-        }
+    course_ids: Dict[CourseCode, int]
+    _codes: List[CourseCode]
+    _first_index: Dict[CourseCode, int]
+    _max_terms: List[int]
 
-        # In case there are duplicate courses, only let a course in course_ids
-        # get used once
-        self.claimed_ids = set(self.course_ids.keys())
+    def __init__(
+        self, courses: List[ProcessedCourse], course_ids: Dict[CourseCode, int]
+    ) -> None:
+        self.course_ids = course_ids
+        self._codes = []
+        self._first_index = {}
+        self._max_terms = []
+        for course in courses:
+            if course.course_code is None:
+                continue
+            self._first_index.setdefault(course.course_code, len(self._codes))
+            self._codes.append(course.course_code)
+            self._max_terms.append(
+                max(self._max_terms[-1], course.term_index)
+                if self._max_terms
+                else course.term_index
+            )
 
-    # 4. Get prerequisites
-    def _find_prereq(
+    def find(
         self,
         prereq_ids: List[int],
         coreq_ids: List[int],
@@ -120,10 +128,10 @@ class OutputCourses:
         satisfy the prerequisites for another course shows up *later* in a plan.
         See #47.
 
-        This also *only* uses the first (i.e. earliest, as
-        `self.processed_courses` is chronological) prerequisite found. It
-        shouldn't matter too much if there are too many prerequisite arrows, but
-        it does affect the complexity score on Curricular Analytics. See #25.
+        This also *only* uses the first (i.e. earliest, as plans are
+        chronological) prerequisite found. It shouldn't matter too much if there
+        are too many prerequisite arrows, but it does affect the complexity
+        score on Curricular Analytics. See #25.
 
         `prereq_ids` and `coreq_ids` are mutable *references* to a list to which
         prerequisite course IDs are added.
@@ -131,69 +139,100 @@ class OutputCourses:
         `before` is the term index of the course in question to prevent a course
         from being marked as a prereq of a past course.
         """
-        # Find first processed course whose code is in `alternatives`
-        for course in self.processed_courses:
-            if course.course_code is None:
-                continue
-            if course.term_index >= before:
+        # Find first processed course whose code is in `alternatives`, stopping
+        # at the first course taken in or after `before`
+        stop = bisect_left(self._max_terms, before)
+        first = min(
+            (self._first_index.get(code, stop) for code, _ in alternatives),
+            default=stop,
+        )
+        if first >= stop:
+            return
+        for code, concurrent in alternatives:
+            if self._codes[first] == code:
+                (coreq_ids if concurrent else prereq_ids).append(self.course_ids[code])
                 return
-            for code, concurrent in alternatives:
-                if course.course_code == code:
-                    (coreq_ids if concurrent else prereq_ids).append(
-                        self.course_ids[course.course_code]
-                    )
-                    return
-
-    def list_courses(
-        self, show_major: Optional[bool] = None
-    ) -> Generator[OutputCourse, None, None]:
-        """
-        The methods involved with actually outputting the CSV/JSON file should
-        call this method, yielding `OutputCourse`s.
-
-        `show_major` filters courses by whether they're a major or college
-        requirement. If `show_major` is None or unspecified, all courses will be
-        yielded.
-        """
-        for course_title, code, units, major_course, term, _ in self.processed_courses:
-            if show_major is not None and major_course != show_major:
-                continue
 
-            if code in self.claimed_ids:
-                course_id = self.course_ids[code]
-                self.claimed_ids.remove(code)
-            else:
-                course_id = self.current_id
-                self.current_id += 1
 
-            prereq_ids: List[int] = []
-            coreq_ids: List[int] = []
-            if code:
-                reqs = prereqs(university.get_term_code(self.year, term)).get(code)
+def _resolve(
+    courses: List[ProcessedCourse],
+    year: int,
+    course_ids: Dict[CourseCode, int],
+    start_id: int,
+) -> ResolvedPlan:
+    """
+    `course_ids` and `start_id` are the curriculum's course IDs and next
+    unassigned ID.
+    """
+    # 3. Assign course IDs. Degree plan courses missing from the curriculum
+    # don't share IDs with other degree plans' on Curricular Analytics, so this
+    # is a copy
+    course_ids = {**course_ids}
+    for course in courses:
+        if course.course_code and course.course_code not in course_ids:
+            course_ids[course.course_code] = start_id
+            start_id += 1
+
+    # 4. Get prerequisites. They only depend on course codes, so they're the
+    # same for both orderings
+    finder = _PrereqFinder(courses, course_ids)
+    requisites: List[Tuple[List[int], List[int]]] = []
+    for course_title, code, _, _, term, _ in courses:
+        prereq_ids: List[int] = []
+        coreq_ids: List[int] = []
+        if code:
+            reqs = plan_term_prereqs(year, term).get(code)
+        else:
+            reqs = university.non_course_prereqs.get(course_title)
+        if reqs:
+            for alternatives in reqs:
+                finder.find(prereq_ids, coreq_ids, alternatives, term)
+        requisites.append((prereq_ids, coreq_ids))
+
+    # Get duplicate course titles so can start with "GE 1" and so on
+    title_counts = Counter(course.course_title for course in courses)
+    duplicate_titles = {title for title, count in title_counts.items() if count > 1}
+
+    def list_courses(order: List[int]) -> Tuple[OutputCourse, ...]:
+        current_id = start_id
+        # In case there are duplicate courses, only let a course in course_ids
+        # get used once
+        claimed_ids = set(course_ids.keys())
+        title_numbers = {title: 0 for title in duplicate_titles}
+        output: List[OutputCourse] = []
+        for index in order:
+            course_title, code, units, _, term, _ = courses[index]
+            if code in claimed_ids:
+                course_id = course_ids[code]
+                claimed_ids.remove(code)
             else:
-                reqs = university.non_course_prereqs.get(course_title)
-            if reqs:
-                for alternatives in reqs:
-                    self._find_prereq(
-                        prereq_ids,
-                        coreq_ids,
-                        alternatives,
-                        term,
-                    )
-
-            if course_title in self.duplicate_titles:
-                self.duplicate_titles[course_title] += 1
-                course_title = f"{course_title} {self.duplicate_titles[course_title]}"
-
-            yield OutputCourse(
-                course_id,
-                course_title,
-                code or CourseCode("", ""),
-                prereq_ids,
-                coreq_ids,
-                units,
-                term,
+                course_id = current_id
+                current_id += 1
+            if course_title in title_numbers:
+                title_numbers[course_title] += 1
+                course_title = f"{course_title} {title_numbers[course_title]}"
+            prereq_ids, coreq_ids = requisites[index]
+            output.append(
+                OutputCourse(
+                    course_id,
+                    course_title,
+                    code or CourseCode("", ""),
+                    prereq_ids,
+                    coreq_ids,
+                    units,
+                    term,
+                )
             )
+        return tuple(output)
+
+    major_indices = [i for i, course in enumerate(courses) if course.for_major]
+    college_indices = [i for i, course in enumerate(courses) if not course.for_major]
+    sectioned = list_courses(major_indices + college_indices)
+    return ResolvedPlan(
+        list_courses(list(range(len(courses)))),
+        sectioned[: len(major_indices)],
+        sectioned[len(major_indices) :],
+    )
 
 
 class MajorOutput:
@@ -208,18 +247,36 @@ class MajorOutput:
     course_ids: Dict[CourseCode, int]
     curriculum: List[ProcessedCourse]
     start_id: int
+    _resolved: Dict[Optional[str], ResolvedPlan]
 
     def __init__(self, plans: MajorPlans, start_id: int = 1) -> None:
         self.plans = plans
         self.course_ids = {}
         self.curriculum = self.plans.curriculum()
         self.start_id = start_id
+        self._resolved = {}
 
         for course in self.curriculum:
             if course.course_code and course.course_code not in self.course_ids:
                 self.course_ids[course.course_code] = self.start_id
                 self.start_id += 1
 
+    def resolve(self, college: Optional[str] = None) -> ResolvedPlan:
+        """
+        Resolves the college's degree plan, or the curriculum if no college is
+        specified. Each plan is only resolved once, so outputting a plan in
+        multiple formats doesn't repeat the work.
+        """
+        college = college or None
+        if college not in self._resolved:
+            self._resolved[college] = _resolve(
+                self.plans.plan(college) if college else self.curriculum,
+                self.plans.year,
+                self.course_ids,
+                self.start_id,
+            )
+        return self._resolved[college]
+
     def output(self, college: Optional[str] = None) -> str:
         """
         Outputs a curriculum or degree plan in Curricular Analytics' CSV
@@ -252,7 +309,7 @@ class MajorOutput:
         output.row("System Type", university.term_type)
         output.row("CIP", major_info.cip_code)
 
-        processed = OutputCourses(self, college)
+        resolved = self.resolve(college)
 
         for major_course_section in True, False:
             if not college and not major_course_section:
@@ -267,7 +324,11 @@ class MajorOutput:
                 coreq_ids,
                 units,
                 term,
-            ) in processed.list_courses(major_course_section):
+            ) in (
+                resolved.major_courses
+                if major_course_section
+                else resolved.college_courses
+            ):
                 output.row(
                     str(course_id),  # Course ID
                     course_title,  # Course Name
@@ -292,7 +353,7 @@ class MajorOutput:
         a GUI.
         """
         curriculum = obj.Curriculum(curriculum_terms=[])
-        processed = OutputCourses(self, college)
+        resolved = self.resolve(college)
         # Put college courses at the bottom of each quarter, consistent with CSV
         for major_course_section in True, False:
             if not college and not major_course_section:
@@ -305,7 +366,11 @@ class MajorOutput:
                 coreq_ids,
                 units,
                 term,
-            ) in processed.list_courses(major_course_section):
+            ) in (
+                resolved.major_courses
+                if major_course_section
+                else resolved.college_courses
+            ):
                 if not college:
                     term = 0
                 while term >= len(curriculum["curriculum_terms"]):
@@ -337,7 +402,7 @@ class MajorOutput:
         return curriculum
 
     def output_degree_plan(self, college: Optional[str] = None) -> ca.DegreePlan:
-        processed = list(OutputCourses(self, college).list_courses())
+        processed = self.resolve(college).courses
         course_objects: List[ca.AbstractCourse] = []
         course_object_by_id: Dict[int, ca.AbstractCourse] = {}
         for course in processed:
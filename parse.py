@@ -5,26 +5,56 @@ manipulation.
 Exports:
     `prereqs`, a dictionary mapping from a subject code-number tuple to a list
     of prerequisites, which are each lists of possible course codes to satisfy
-    the requirement.
+    the requirement. `plan_term_prereqs` gets the prereqs for a term of a plan.
 
     `major_plans`, a dictionary mapping from ISIS major codes to `MajorPlans`
     objects, which contains a dictionary mapping college codes to `Plan`s, which
     have a list of list of `PlannedCourse`s for each quarter.
 
+    `load_all_plans`, a `PlanIndex` mapping each start year and plan length to
+    that year's `major_plans`, which lists which years exist without trying to
+    open a file for each.
+
     `major_codes`, a dictionary mapping from ISIS major codes to `MajorInfo`
     objects, which contains data from the ISIS major codes spreadsheet.
 
 python3 parse.py <year> # Get a list of major codes to upload with upload.sh
 """
 
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
 import csv
 from functools import cached_property
+import hashlib
+import json
 import os
-from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import re
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    cast,
+)
+
+import columnar
 from parse_defs import CourseCode, ProcessedCourse, Prerequisite, RawCourse, TermCode
 from university import university
 
-__all__ = ["prereqs", "major_plans", "major_codes"]
+__all__ = [
+    "prereqs",
+    "available_term",
+    "plan_term_prereqs",
+    "major_plans",
+    "load_all_plans",
+    "FIRST_PLAN_YEAR",
+    "major_codes",
+]
 
 
 def prereq_rows_to_dict(
@@ -69,65 +99,363 @@ def prereq_rows_to_dict(
     return courses
 
 
+def prereq_table_to_dict(
+    table: columnar.Table,
+) -> Dict[CourseCode, List[List[Prerequisite]]]:
+    """
+    Like `prereq_rows_to_dict`, but reads from a memory-mapped sidecar written
+    by `columnar.write_prereqs`. Course codes and prerequisites are only created
+    once per distinct course, so they are shared between requirements.
+    """
+    strings = table.strings
+    codes: Dict[Tuple[int, int], CourseCode] = {}
+    reqs: Dict[Tuple[int, int, int], Prerequisite] = {}
+    courses: Dict[CourseCode, List[List[Prerequisite]]] = {}
+    rows = cast(Iterable[Tuple[int, int, int, int, int, int]], zip(*table.columns))
+    for subject, number, req_id, req_subj, req_num, allow_concurrent in rows:
+        course = codes.get((subject, number))
+        if course is None:
+            course = codes[subject, number] = CourseCode(
+                strings[subject], strings[number]
+            )
+        if course not in courses:
+            courses[course] = []
+        if req_id == 0:
+            continue
+        prereq = reqs.get((req_subj, req_num, allow_concurrent))
+        if prereq is None:
+            req_code = codes.get((req_subj, req_num))
+            if req_code is None:
+                req_code = codes[req_subj, req_num] = CourseCode(
+                    strings[req_subj], strings[req_num]
+                )
+            prereq = reqs[req_subj, req_num, allow_concurrent] = Prerequisite(
+                req_code, allow_concurrent == 1
+            )
+        requirements = courses[course]
+        while len(requirements) < req_id:
+            requirements.append([])
+        requirements[req_id - 1].append(prereq)
+    return courses
+
+
 def terms() -> List[TermCode]:
     return _cache.terms
 
 
+_term_aliases: Dict[str, TermCode] = {}
+
+
+def available_term(term: str) -> TermCode:
+    """
+    Returns the term with prereqs nearest to `term`, which is `term` itself if
+    it has prereqs. Terms before or after every term with prereqs use the
+    first or last term. Regular quarters only fall back to regular quarters,
+    and summer sessions to summer sessions, if possible; ties go to the earlier
+    term.
+
+    Distance is counted in terms of the same kind, so FA20 is as far from SP20
+    as it is from WI21, even though there are summer sessions in between.
+    """
+    if term in _term_aliases:
+        return _term_aliases[term]
+    term = TermCode(term)
+    regular = term.quarter() in university.terms
+    candidates = [
+        available
+        for available in terms()
+        if (available.quarter() in university.terms) == regular
+    ]
+    quarters = [
+        quarter
+        for quarter in TermCode.quarters
+        if (quarter in university.terms) == regular
+    ]
+    if not candidates:
+        candidates = terms()
+        quarters = TermCode.quarters
+
+    def step(term: TermCode) -> int:
+        return term.year() * len(quarters) + quarters.index(term.quarter())
+
+    index = bisect_left(candidates, term)
+    if index < len(candidates) and candidates[index] == term:
+        nearest = term
+    elif index == 0:
+        nearest = candidates[0]
+    elif index == len(candidates):
+        nearest = candidates[-1]
+    else:
+        before = candidates[index - 1]
+        after = candidates[index]
+        nearest = (
+            after if step(after) - step(term) < step(term) - step(before) else before
+        )
+    _term_aliases[term] = nearest
+    return nearest
+
+
 _prereq_cache: Dict[TermCode, Dict[CourseCode, List[List[Prerequisite]]]] = {}
 
 
 def prereqs(term: str) -> Dict[CourseCode, List[List[Prerequisite]]]:
-    term = TermCode(term)
-    if term < terms()[0]:
-        term = terms()[0]
-    elif term > terms()[-1]:
-        term = terms()[-1]
+    """
+    Gets the prereqs for a term. If the term has no prereqs, the prereqs of
+    the nearest term that does are used (see `available_term`).
+    """
+    term = available_term(term)
     if term not in _prereq_cache:
+        path = f"./files/prereqs/prereqs_{term}.csv"
         try:
-            with open(f"./files/prereqs/prereqs_{term}.csv", newline="") as file:
-                _prereq_cache[term] = prereq_rows_to_dict(csv.reader(file))
+            if columnar.is_fresh(path):
+                try:
+                    with columnar.read_table(
+                        path, columnar.PREREQS_MAGIC, columnar.PREREQ_COLUMNS
+                    ) as table:
+                        _prereq_cache[term] = prereq_table_to_dict(table)
+                except ValueError:
+                    # The sidecar is from an older version, so use the CSV
+                    pass
+            if term not in _prereq_cache:
+                with open(path, newline="") as file:
+                    _prereq_cache[term] = prereq_rows_to_dict(csv.reader(file))
             university.fix_prereqs(_prereq_cache[term], term)
         except FileNotFoundError:
             _prereq_cache[term] = {}
     return _prereq_cache[term]
 
 
+_plan_term_cache: Dict[Tuple[int, int], Dict[CourseCode, List[List[Prerequisite]]]] = {}
+
+
+def plan_term_prereqs(
+    start_year: int, term_index: int
+) -> Dict[CourseCode, List[List[Prerequisite]]]:
+    """
+    Gets the prereqs for the `term_index`th term of a plan starting in
+    `start_year` (see `ProcessedCourse.term_index`). Equivalent to
+    `prereqs(university.get_term_code(start_year, term_index))`, but the term
+    is only resolved once, since plans look up the same few terms for every
+    course.
+    """
+    reqs = _plan_term_cache.get((start_year, term_index))
+    if reqs is None:
+        reqs = _plan_term_cache[start_year, term_index] = prereqs(
+            university.get_term_code(start_year, term_index)
+        )
+    return reqs
+
+
+class PlanStore:
+    """
+    Stores the rows of academic plans in typed arrays rather than a `RawCourse`
+    per row. Titles are interned, and the store is shared between every plan
+    year, so a title only takes up memory once no matter how many plans it's
+    in. `RawCourse`s are only created when a plan is processed.
+
+    `ProcessedCourse`s are interned too, so identical courses in different
+    plans, such as the same major course in every college's plan, are the same
+    object.
+    """
+
+    __slots__ = (
+        "titles",
+        "_title_ids",
+        "_titles",
+        "_units",
+        "_flags",
+        "_years",
+        "_quarters",
+        "_processed",
+    )
+
+    titles: List[str]
+    _title_ids: Dict[str, int]
+    _titles: "array[int]"
+    _units: "array[float]"
+    # Bit 0 is set for department courses, and bit 1 if the course overlaps
+    # with a GE
+    _flags: "array[int]"
+    _years: "array[int]"
+    _quarters: "array[int]"
+    _processed: Dict[ProcessedCourse, ProcessedCourse]
+
+    def __init__(self) -> None:
+        self.titles = []
+        self._title_ids = {}
+        self._titles = array("i")
+        self._units = array("d")
+        self._flags = array("B")
+        self._years = array("b")
+        self._quarters = array("b")
+        self._processed = {}
+
+    def add(
+        self,
+        course_title: str,
+        units: float,
+        course_type: str,
+        overlaps_ge: bool,
+        year: int,
+        quarter: int,
+    ) -> int:
+        """
+        Adds a row and returns its index.
+        """
+        if course_type != "COLLEGE" and course_type != "DEPARTMENT":
+            raise TypeError('Course type is neither "COLLEGE" nor "DEPARTMENT"')
+        title_id = self._title_ids.get(course_title)
+        if title_id is None:
+            title_id = self._title_ids[course_title] = len(self.titles)
+            self.titles.append(course_title)
+        self._titles.append(title_id)
+        self._units.append(units)
+        self._flags.append((course_type == "DEPARTMENT") | (overlaps_ge << 1))
+        self._years.append(year)
+        self._quarters.append(quarter)
+        return len(self._titles) - 1
+
+    def raw(self, row: int) -> RawCourse:
+        flags = self._flags[row]
+        return RawCourse(
+            self.titles[self._titles[row]],
+            self._units[row],
+            "DEPARTMENT" if flags & 1 else "COLLEGE",
+            bool(flags & 2),
+            self._years[row],
+            self._quarters[row],
+        )
+
+    def digest(self, rows: "array[int]") -> str:
+        """
+        Hashes the contents of rows, so plans with the same courses in the same
+        order have the same hash regardless of where their rows are stored or
+        which run of the program loaded them.
+        """
+        digest = hashlib.sha256()
+        for row in rows:
+            digest.update(json.dumps(self.raw(row)).encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def process(self, rows: "array[int]") -> List[ProcessedCourse]:
+        processed = university.process_plan([self.raw(row) for row in rows])
+        return [self._processed.setdefault(course, course) for course in processed]
+
+
+_plan_store = PlanStore()
+
+
+class _RawPlans(Mapping[str, List[RawCourse]]):
+    """
+    A read-only view of a major's plans as lists of `RawCourse`s, which are
+    created each time a plan is accessed.
+    """
+
+    __slots__ = ("_store", "_rows")
+
+    _store: PlanStore
+    _rows: Dict[str, "array[int]"]
+
+    def __init__(self, store: PlanStore, rows: Dict[str, "array[int]"]) -> None:
+        self._store = store
+        self._rows = rows
+
+    def __getitem__(self, college: str) -> List[RawCourse]:
+        return [self._store.raw(row) for row in self._rows[college]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
 class MajorPlans:
     """
     Represents a major's set of academic plans. Contains plans for each college.
 
     To get the plan for a specific college, use the two-letter college code. For
     example, `plan("FI")` contains the academic plan for ERC (Fifth College).
+
+    The rows of each plan are kept in a `PlanStore`; `raw_plans` lists them as
+    `RawCourse`s, and `plan_hash` hashes their contents.
     """
 
+    __slots__ = (
+        "year",
+        "department",
+        "major_code",
+        "colleges",
+        "_store",
+        "_rows",
+        "_parsed_plans",
+        "_hashes",
+    )
+
     year: int
     # TODO: MajorPlan.department vs MajorInfo.department
     department: str
     major_code: str
     colleges: Set[str]
-    raw_plans: Dict[str, List[RawCourse]]
+    _store: PlanStore
+    _rows: Dict[str, "array[int]"]
     _parsed_plans: Dict[str, List[ProcessedCourse]]
-
-    def __init__(self, year: int, department: str, major_code: str) -> None:
+    _hashes: Dict[str, str]
+
+    def __init__(
+        self,
+        year: int,
+        department: str,
+        major_code: str,
+        store: PlanStore = _plan_store,
+    ) -> None:
         self.year = year
         self.department = department
         self.major_code = major_code
         self.colleges = set()
-        self.raw_plans = {}
+        self._store = store
+        self._rows = {}
         self._parsed_plans = {}
-
-    def add_raw_course(self, college_code: str, course: RawCourse) -> None:
-        if college_code not in self.colleges:
+        self._hashes = {}
+
+    @property
+    def raw_plans(self) -> Mapping[str, List[RawCourse]]:
+        return _RawPlans(self._store, self._rows)
+
+    def add_course(
+        self,
+        college_code: str,
+        course_title: str,
+        units: float,
+        course_type: str,
+        overlaps_ge: bool,
+        year: int,
+        quarter: int,
+    ) -> None:
+        if college_code not in self._rows:
             if university.keep_plan(self.year, college_code):
                 self.colleges.add(college_code)
-            self.raw_plans[college_code] = []
-        self.raw_plans[college_code].append(course)
+            self._rows[college_code] = array("i")
+        self._rows[college_code].append(
+            self._store.add(
+                course_title, units, course_type, overlaps_ge, year, quarter
+            )
+        )
+
+    def plan_hash(self, college: str) -> str:
+        """
+        A content hash of `raw_plans[college]` that stays the same across runs,
+        so identical plans from different years can be recognized without
+        comparing their courses.
+        """
+        if college not in self._hashes:
+            self._hashes[college] = self._store.digest(self._rows[college])
+        return self._hashes[college]
 
     def plan(self, college: str) -> List[ProcessedCourse]:
         if college not in self._parsed_plans:
-            self._parsed_plans[college] = university.process_plan(
-                self.raw_plans[college]
-            )
+            self._parsed_plans[college] = self._store.process(self._rows[college])
         return self._parsed_plans[college]
 
     def curriculum(self, college: Optional[str] = None) -> List[ProcessedCourse]:
@@ -160,12 +488,16 @@ class MajorPlans:
         return [course for course in self.plan(college) if course.for_major]
 
 
-def plan_rows_to_dict(rows: Iterable[List[str]]) -> Dict[str, MajorPlans]:
+def plan_rows_to_dicts(
+    rows: Iterable[List[str]],
+) -> Dict[Tuple[int, int], Dict[str, MajorPlans]]:
     """
-    Converts the academic plans CSV rows into a dictionary of major codes to
-    `Major` objects.
+    Converts academic plan CSV rows from any number of plan years and lengths,
+    such as the rows of the master plans CSV, into a dictionary mapping from a
+    start year and plan length to a dictionary of major codes to `MajorPlans`
+    objects. Rows without a plan length are for 4-year plans.
     """
-    plans: Dict[str, MajorPlans] = {}
+    groups: Dict[Tuple[int, int], Dict[str, MajorPlans]] = {}
     for (
         department,  # Department
         major_code,  # Major
@@ -177,23 +509,70 @@ def plan_rows_to_dict(rows: Iterable[List[str]]) -> Dict[str, MajorPlans]:
         year,  # Start Year
         plan_yr,  # Year Taken
         plan_qtr,  # Quarter Taken
-        *_,  # Term Taken, Plan Length
+        *rest,  # Term Taken, Plan Length
     ) in rows:
         year = int(year)
+        key = year, int(rest[1]) if len(rest) > 1 else 4
+        plans = groups.get(key)
+        if plans is None:
+            plans = groups[key] = {}
         if major_code not in plans:
             plans[major_code] = MajorPlans(year, department, major_code)
-        if course_type != "COLLEGE" and course_type != "DEPARTMENT":
-            raise TypeError('Course type is neither "COLLEGE" nor "DEPARTMENT"')
-        plans[major_code].add_raw_course(
+        plans[major_code].add_course(
             college_code,
-            RawCourse(
-                course_title,
-                float(units),
-                course_type,
-                overlap == "Y",
-                int(plan_yr) - 1,
-                int(plan_qtr) - 1,
-            ),
+            course_title,
+            float(units),
+            course_type,
+            overlap == "Y",
+            int(plan_yr) - 1,
+            int(plan_qtr) - 1,
+        )
+    return groups
+
+
+def plan_rows_to_dict(rows: Iterable[List[str]]) -> Dict[str, MajorPlans]:
+    """
+    Converts the academic plans CSV rows of a single plan year and length into
+    a dictionary of major codes to `Major` objects.
+    """
+    empty: Dict[str, MajorPlans] = {}
+    return next(iter(plan_rows_to_dicts(rows).values()), empty)
+
+
+def plan_table_to_dict(table: columnar.Table) -> Dict[str, MajorPlans]:
+    """
+    Like `plan_rows_to_dict`, but reads from a memory-mapped sidecar written by
+    `columnar.write_plans`.
+    """
+    strings = table.strings
+    plans: Dict[str, MajorPlans] = {}
+    rows = cast(
+        Iterable[Tuple[int, int, int, int, float, int, int, int, int, int]],
+        zip(*table.columns),
+    )
+    for (
+        department,
+        major_code,
+        college_code,
+        course_title,
+        units,
+        course_type,
+        overlap,
+        year,
+        plan_yr,
+        plan_qtr,
+    ) in rows:
+        major_code = strings[major_code]
+        if major_code not in plans:
+            plans[major_code] = MajorPlans(year, strings[department], major_code)
+        plans[major_code].add_course(
+            strings[college_code],
+            strings[course_title],
+            units,
+            strings[course_type],
+            overlap == 1,
+            plan_yr - 1,
+            plan_qtr - 1,
         )
     return plans
 
@@ -203,9 +582,20 @@ _plan_cache: Dict[Tuple[int, int], Dict[str, MajorPlans]] = {}
 
 def major_plans(year: int, length: int = 4) -> Dict[str, MajorPlans]:
     if (year, length) not in _plan_cache:
+        path = f"./files/plans/plans_{year}_{length}yr.csv"
         try:
-            with open(f"./files/plans/plans_{year}_{length}yr.csv", newline="") as file:
-                _plan_cache[year, length] = plan_rows_to_dict(csv.reader(file))
+            if columnar.is_fresh(path):
+                try:
+                    with columnar.read_table(
+                        path, columnar.PLANS_MAGIC, columnar.PLAN_COLUMNS
+                    ) as table:
+                        _plan_cache[year, length] = plan_table_to_dict(table)
+                except ValueError:
+                    # The sidecar is from an older version, so use the CSV
+                    pass
+            if (year, length) not in _plan_cache:
+                with open(path, newline="") as file:
+                    _plan_cache[year, length] = plan_rows_to_dict(csv.reader(file))
         except FileNotFoundError:
             _plan_cache[year, length] = {}
     return _plan_cache[year, length]
@@ -257,6 +647,9 @@ def major_rows_to_dict(rows: Iterable[List[str]]) -> Dict[str, MajorInfo]:
     return majors
 
 
+_plan_file_re = re.compile(r"plans_(\d+)_(\d+)yr\.csv")
+
+
 class _ParseCache:
     @cached_property
     def terms(self) -> List[TermCode]:
@@ -266,6 +659,15 @@ class _ParseCache:
             if name.startswith("prereqs_") and name.endswith(".csv")
         )
 
+    @cached_property
+    def plan_files(self) -> List[Tuple[int, int]]:
+        files: List[Tuple[int, int]] = []
+        for name in os.listdir("./files/plans/"):
+            match = _plan_file_re.fullmatch(name)
+            if match:
+                files.append((int(match[1]), int(match[2])))
+        return sorted(files)
+
     @cached_property
     def major_codes(self) -> Dict[str, MajorInfo]:
         with open(university.majors_file, newline="") as file:
@@ -281,6 +683,85 @@ def major_codes() -> Dict[str, MajorInfo]:
     return _cache.major_codes
 
 
+FIRST_PLAN_YEAR = 2015
+"""
+The first start year the scripts report plans for.
+"""
+
+
+class PlanIndex(Mapping[Tuple[int, int], Dict[str, MajorPlans]]):
+    """
+    Maps every start year and plan length that has plans to the plans, which
+    are only loaded when first accessed (see `major_plans`).
+    """
+
+    __slots__ = ("_keys",)
+
+    _keys: Dict[Tuple[int, int], None]
+
+    def __init__(self, keys: Iterable[Tuple[int, int]]) -> None:
+        self._keys = dict.fromkeys(sorted(keys))
+
+    def __getitem__(self, key: Tuple[int, int]) -> Dict[str, MajorPlans]:
+        if key not in self._keys:
+            raise KeyError(key)
+        return major_plans(*key)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def years(self, length: int = 4, start: int = FIRST_PLAN_YEAR) -> List[int]:
+        """
+        Lists the start years with plans of the given length, in order, from
+        `start` up to the first year without any. Earlier years, and years
+        after a gap, are left out.
+        """
+        years: List[int] = []
+        while (start + len(years), length) in self._keys:
+            years.append(start + len(years))
+        return years
+
+    def lengths(self, year: int) -> List[int]:
+        return [
+            plan_length for plan_year, plan_length in self._keys if plan_year == year
+        ]
+
+    def by_year(
+        self, length: int = 4, start: int = FIRST_PLAN_YEAR
+    ) -> Iterator[Tuple[int, Dict[str, MajorPlans]]]:
+        """
+        Yields each start year from `years` and its plans of the given length.
+        """
+        for year in self.years(length, start):
+            yield year, major_plans(year, length)
+
+
+def load_all_plans(source: Optional[str] = None) -> PlanIndex:
+    """
+    Indexes the plans of every start year and plan length.
+
+    By default, the split files in `files/plans/` are listed once, and each
+    year's plans are loaded when they're first accessed. If `source` is the
+    path to an unsplit plans CSV, such as `files/academic_plans_fa23.csv`, it's
+    read in a single pass and every year is loaded up front.
+
+    Either way, the plans are the same objects `major_plans` returns, and every
+    year shares one `PlanStore` and title cache, so a title is only cleaned
+    once.
+    """
+    if source is None:
+        return PlanIndex(_cache.plan_files)
+    with open(source, newline="") as file:
+        reader = csv.reader(file)
+        next(reader)  # Skip header
+        groups = plan_rows_to_dicts(reader)
+    _plan_cache.update(groups)
+    return PlanIndex(groups.keys())
+
+
 if __name__ == "__main__":
     import sys
 
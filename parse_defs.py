@@ -1,5 +1,10 @@
 import re
-from typing import Literal, NamedTuple, Optional, Self, Tuple
+from typing import Dict, Literal, NamedTuple, Optional, Self, Tuple
+
+# Sort keys are computed once per distinct term or course code, since sorting
+# compares the same codes many times
+_term_keys: Dict[str, int] = {}
+_course_keys: Dict[Tuple[str, str], Tuple[str, int, str]] = {}
 
 
 class TermCode(str):
@@ -18,13 +23,18 @@ class TermCode(str):
         # Assumes 21st century (all the plans we have are in the 21st century)
         return 2000 + int(self[2:4])
 
+    def sort_key(self) -> int:
+        key = _term_keys.get(self)
+        if key is None:
+            key = _term_keys[self] = self.year() * len(TermCode.quarters) + (
+                self.quarter_value()
+            )
+        return key
+
     def __lt__(self, other: str) -> bool:
         if not isinstance(other, TermCode):
             raise NotImplemented
-        if self.year() == other.year():
-            return self.quarter_value() < other.quarter_value()
-        else:
-            return self.year() < other.year()
+        return self.sort_key() < other.sort_key()
 
     def __le__(self, other: str) -> bool:
         return self < other or self == other
@@ -41,6 +51,12 @@ class CourseCode(NamedTuple):
     number: str
 
     def parts(self) -> Tuple[str, int, str]:
+        key = _course_keys.get(self)
+        if key is None:
+            key = _course_keys[self] = self._parse_parts()
+        return key
+
+    def _parse_parts(self) -> Tuple[str, int, str]:
         for i, char in enumerate(self.number):
             if not char.isdigit():
                 index = i
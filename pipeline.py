@@ -0,0 +1,353 @@
+"""
+Runs the Python report scripts that `make all` runs, but loads the split
+prereq and plan files once and then forks a process per report so the reports
+are generated in parallel. Reports whose inputs haven't changed since the last
+successful run are skipped; content hashes of each report's inputs are kept in
+`files/pipeline_hashes.json`.
+
+Each report still runs its script as `__main__`, exactly as the Makefile does,
+so its output is unchanged. Only the fragments and data files are generated
+here; the Makefile still assembles the HTML reports from them.
+
+python3 pipeline.py
+python3 pipeline.py --jobs 4 --year 2025 prereq-diffs prereq-timeline
+python3 pipeline.py --force
+"""
+
+from contextlib import redirect_stdout
+import hashlib
+import json
+import multiprocessing
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+import os
+import runpy
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from parse import load_all_plans, major_codes, prereqs, terms
+
+HASHES_PATH = "./files/pipeline_hashes.json"
+
+PARSE_SOURCES = [
+    "parse.py",
+    "parse_defs.py",
+    "university.py",
+    "columnar.py",
+    "util.py",
+    "files/prereqs/",
+    "files/plans/",
+    "files/isis_major_code_list.csv",
+]
+OUTPUT_SOURCES = PARSE_SOURCES + ["output.py", "output_json.py"]
+DEPARTMENT_SOURCES = ["departments.py", "files/LoadSearchControls.json"]
+
+
+class Stage(NamedTuple):
+    """
+    A report script to run.
+
+    If `stdout` is set, the script's standard output is written to that file;
+    otherwise, the script writes `outputs` itself. `inputs` are the files and
+    directories whose contents determine whether the report needs to be
+    regenerated, and `after` lists stages whose outputs this stage reads.
+    """
+
+    name: str
+    argv: List[str]
+    outputs: List[str]
+    inputs: List[str]
+    stdout: Optional[str] = None
+    after: List[str] = []
+
+
+def get_stages(year_start: int, year: int) -> List[Stage]:
+    return [
+        Stage(
+            "plan-metrics",
+            ["plan_metrics.py"],
+            ["files/metrics_fa12_py.csv"],
+            ["plan_metrics.py", "metrics.py", *OUTPUT_SOURCES],
+        ),
+        Stage(
+            "course-metrics",
+            ["course_metrics.py"],
+            ["files/courses_fa12_py.csv"],
+            ["course_metrics.py", "metrics.py", *OUTPUT_SOURCES],
+        ),
+        Stage(
+            "course-overlap",
+            ["course_overlap.py"],
+            ["files/course_overlap_py.csv"],
+            ["course_overlap.py", *PARSE_SOURCES],
+        ),
+        Stage(
+            "academic-plan-diffs",
+            ["diff_plan.py", str(year_start), str(year)],
+            ["reports/output/academic-plan-diffs.json"],
+            [
+                "diff_plan.py",
+                "curricula_index.py",
+                "upload.py",
+                "api.py",
+                *[f"files/uploaded{y}.yml" for y in range(year_start, year + 1)],
+                "files/metrics_fa12_py.csv",
+                *OUTPUT_SOURCES,
+                *DEPARTMENT_SOURCES,
+            ],
+            stdout="reports/output/academic-plan-diffs.json",
+            after=["plan-metrics"],
+        ),
+        Stage(
+            "prereq-diffs",
+            ["diff_prereqs.py"],
+            ["reports/output/prereq-diffs-fragment.html"],
+            [
+                "diff_prereqs.py",
+                "common_prereqs.py",
+                "prereq_graph.py",
+                *PARSE_SOURCES,
+            ],
+            stdout="reports/output/prereq-diffs-fragment.html",
+        ),
+        Stage(
+            "prereq-timeline",
+            ["diff_prereqs.py", "timeline"],
+            ["reports/output/prereq-timeline-fragment.html"],
+            [
+                "diff_prereqs.py",
+                "common_prereqs.py",
+                "prereq_graph.py",
+                *PARSE_SOURCES,
+            ],
+            stdout="reports/output/prereq-timeline-fragment.html",
+        ),
+        Stage(
+            "college-ge-units",
+            ["college_ges.py", str(year), "html"],
+            ["reports/output/college-ge-units-fragment.html"],
+            ["college_ges.py", *PARSE_SOURCES],
+            stdout="reports/output/college-ge-units-fragment.html",
+        ),
+        Stage(
+            "plan-graph-files",
+            ["dump_graphs.py", "files"],
+            ["plan_csvs/metadata.json"],
+            ["dump_graphs.py", *OUTPUT_SOURCES, *DEPARTMENT_SOURCES],
+        ),
+        Stage(
+            "plan-graph-index",
+            ["dump_graphs.py", "html", "for_public"],
+            ["reports/output/plan-graph-index-fragment.html"],
+            ["dump_graphs.py", *OUTPUT_SOURCES, *DEPARTMENT_SOURCES],
+            stdout="reports/output/plan-graph-index-fragment.html",
+        ),
+        Stage(
+            "flagged-issues",
+            ["flag_issues.py", str(year)],
+            ["files/flagged_issues.html"],
+            ["flag_issues.py", "units_per_course.json", *PARSE_SOURCES],
+            stdout="files/flagged_issues.html",
+        ),
+    ]
+
+
+class _Hasher:
+    """
+    Hashes files and directories by content, remembering the hash of each path
+    so inputs shared between stages are only read once.
+    """
+
+    _hashes: Dict[str, str]
+
+    def __init__(self) -> None:
+        self._hashes = {}
+
+    def path(self, path: str) -> str:
+        if path not in self._hashes:
+            digest = hashlib.sha256()
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    digest.update(name.encode("utf-8"))
+                    digest.update(self.path(os.path.join(path, name)).encode("utf-8"))
+            else:
+                try:
+                    with open(path, "rb") as file:
+                        digest.update(hashlib.file_digest(file, "sha256").digest())
+                except FileNotFoundError:
+                    digest.update(b"missing")
+            self._hashes[path] = digest.hexdigest()
+        return self._hashes[path]
+
+    def forget(self, path: str) -> None:
+        """
+        Rehash a path next time, e.g. after a stage has rewritten it.
+        """
+        self._hashes.pop(path, None)
+
+    def stage(self, stage: Stage) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(stage.argv).encode("utf-8"))
+        for path in stage.inputs:
+            digest.update(self.path(path).encode("utf-8"))
+        return digest.hexdigest()
+
+
+def preload(year_start: int) -> None:
+    """
+    Parses every prereq term and plan year into `parse`'s caches so forked
+    stages share them instead of parsing the files themselves.
+    """
+    for term in terms():
+        prereqs(term)
+    for _, plans in load_all_plans().by_year(start=year_start):
+        for major in plans.values():
+            for college in major.colleges:
+                major.plan(college)
+    major_codes()
+
+
+def _run_stage(stage: Stage) -> None:
+    """
+    Runs in a forked process.
+    """
+    sys.argv = stage.argv
+    try:
+        if stage.stdout is None:
+            runpy.run_path(stage.argv[0], run_name="__main__")
+        else:
+            # Write to a temporary file so a failed stage doesn't leave behind
+            # partial output that looks up to date
+            with open(stage.stdout + ".tmp", "w") as file:
+                with redirect_stdout(file):
+                    runpy.run_path(stage.argv[0], run_name="__main__")
+            os.replace(stage.stdout + ".tmp", stage.stdout)
+    except SystemExit as exit:
+        if exit.code:
+            raise
+
+
+def main(
+    year_start: int,
+    year: int,
+    jobs: int,
+    only: Optional[List[str]] = None,
+    force: bool = False,
+) -> bool:
+    """
+    Returns whether every stage succeeded.
+    """
+    stages = get_stages(year_start, year)
+    if only:
+        stages = [stage for stage in stages if stage.name in only]
+    try:
+        with open(HASHES_PATH) as file:
+            saved_hashes: Dict[str, str] = json.load(file)
+    except FileNotFoundError:
+        saved_hashes = {}
+
+    hasher = _Hasher()
+    pending: Dict[str, Stage] = {}
+    for stage in stages:
+        if (
+            force
+            or saved_hashes.get(stage.name) != hasher.stage(stage)
+            or not all(os.path.exists(output) for output in stage.outputs)
+            or any(dependency in pending for dependency in stage.after)
+        ):
+            pending[stage.name] = stage
+        else:
+            print(f"[{stage.name}] Up to date", file=sys.stderr)
+    if not pending:
+        return True
+
+    start = time.perf_counter()
+    preload(year_start)
+    print(
+        f"Loaded plans and prereqs in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    os.makedirs("./reports/output/", exist_ok=True)
+
+    context = multiprocessing.get_context("fork")
+    running: Dict[int, BaseProcess] = {}
+    stage_names: Dict[int, str] = {}
+    launch_hashes: Dict[str, str] = {}
+    failed: List[str] = []
+    while pending or running:
+        for name, stage in list(pending.items()):
+            if len(running) >= jobs:
+                break
+            if any(dependency in pending for dependency in stage.after) or any(
+                stage_names[sentinel] in stage.after for sentinel in running
+            ):
+                continue
+            if any(dependency in failed for dependency in stage.after):
+                print(f"[{name}] Skipped because a dependency failed", file=sys.stderr)
+                failed.append(name)
+                del pending[name]
+                continue
+            # Dependencies have finished by now, so their outputs are final
+            launch_hashes[name] = hasher.stage(stage)
+            process = context.Process(target=_run_stage, args=(stage,), name=name)
+            process.start()
+            running[process.sentinel] = process
+            stage_names[process.sentinel] = name
+            del pending[name]
+            print(f"[{name}] Started", file=sys.stderr)
+        if not running:
+            continue
+        for sentinel in wait(list(running.keys())):
+            assert isinstance(sentinel, int)
+            process = running.pop(sentinel)
+            process.join()
+            name = stage_names[sentinel]
+            for stage in stages:
+                if stage.name == name:
+                    for output in stage.outputs:
+                        hasher.forget(output)
+            if process.exitcode == 0:
+                saved_hashes[name] = launch_hashes[name]
+                with open(HASHES_PATH, "w") as file:
+                    json.dump(saved_hashes, file, indent="\t")
+                    file.write("\n")
+                print(
+                    f"[{name}] Done at {time.perf_counter() - start:.1f}s",
+                    file=sys.stderr,
+                )
+            else:
+                failed.append(name)
+                print(f"[{name}] Failed ({process.exitcode})", file=sys.stderr)
+    return not failed
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="Generate the Python-made report files in parallel, skipping reports whose inputs haven't changed."
+    )
+    parser.add_argument(
+        "stages",
+        nargs="*",
+        help="Names of stages to run. Default: all of them",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Maximum number of stages to run at once. Default: the number of CPUs",
+    )
+    parser.add_argument("--year-start", type=int, default=2015)
+    parser.add_argument("--year", type=int, required=True, help="The latest plan year.")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Run stages even if their inputs haven't changed.",
+    )
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if not main(args.year_start, args.year, args.jobs, args.stages, args.force):
+        exit(1)
@@ -1,11 +1,13 @@
 """
 python3 plan_metrics.py
+python3 plan_metrics.py --jobs 8
 """
 
-from output import MajorOutput
-from parse import MajorPlans, major_plans
+from typing import List, Tuple
+from metrics import PlanMetrics, metrics_for_major
+from parse import MajorPlans, load_all_plans, major_plans
 from university import university
-from util import CsvWriter, bool_str, float_str
+from util import CsvWriter, bool_str, float_str, map_jobs
 
 HEADER = [
     "Year",
@@ -45,97 +47,123 @@ def write_row(
     major: str,
     college: str,
     plans: MajorPlans,
-    output: MajorOutput,
+    metrics: PlanMetrics,
     significant_difference: str,
 ) -> None:
     courses = plans.plan(college)
-    degree_plan = output.output_degree_plan(college)
-    curriculum = degree_plan.curriculum
+    names = [course.course_title for course in metrics.graph.courses]
+    course_metrics = metrics.course_metrics
+    term_units = metrics.term_units
+    max_term = term_units.index(max(term_units))
+    min_term = term_units.index(min(term_units))
 
     total_units = sum(course.units for course in courses)
     major_units = sum(course.units for course in courses if course.for_major)
 
-    longest_path = curriculum.longest_paths[0] if curriculum.longest_paths else []
-    redundant_reqs = curriculum.extraneous_requisites()
-
     writer.row(
         str(year),  # Year
         major,  # Major
         college,  # College
-        float_str(curriculum.total_complexity),  # Complexity score
+        float_str(metrics.total_complexity),  # Complexity score
         float_str(total_units),  # Units #
         float_str(major_units),  # Units in major #
         float_str(total_units - major_units),  # Units not in major #
-        str(len(longest_path)),  # Longest path #
+        str(len(metrics.longest_path)),  # Longest path #
         # Longest path courses
-        " → ".join(course.name for course in longest_path),
+        " → ".join(names[course] for course in metrics.longest_path),
         # Highest complexity #
-        float_str(curriculum.basic_metrics.max_complexity),
+        float_str(course_metrics.complexity[metrics.max_complexity_course]),
         # Highest complexity name
-        curriculum.basic_metrics.max_complexity_courses[0].name,
+        names[metrics.max_complexity_course],
         # Highest centrality #
-        str(curriculum.basic_metrics.max_centrality),
+        str(course_metrics.centrality[metrics.max_centrality_course]),
         # Highest centrality name
-        curriculum.basic_metrics.max_centrality_courses[0].name,
-        float_str(degree_plan.basic_metrics.max),  # Highest term unit load
+        names[metrics.max_centrality_course],
+        float_str(term_units[max_term]),  # Highest term unit load
         # Highest term unit load name
-        university.get_term_code(year, degree_plan.basic_metrics.max_term),
-        float_str(degree_plan.basic_metrics.min),  # Lowest term unit load
+        university.get_term_code(year, max_term),
+        float_str(term_units[min_term]),  # Lowest term unit load
         # Lowest term unit load name
-        university.get_term_code(year, degree_plan.basic_metrics.min_term),
-        str(len(redundant_reqs)),  # # redundant prereqs
+        university.get_term_code(year, min_term),
+        str(len(metrics.redundant_reqs)),  # # redundant prereqs
         ", ".join(
-            f"{curriculum.course_from_id(prereq).name} → {curriculum.course_from_id(course).name}"
-            for prereq, course in redundant_reqs
+            f"{names[prereq]} → {names[course]}"
+            for prereq, course in metrics.redundant_reqs
         ),  # Redundant prereqs
         float_str(
-            sum(bool(course.requisites) for course in curriculum.courses)
-            / len(curriculum.courses)
+            int(metrics.graph.adjacency.any(axis=0).sum()) / len(names)
         ),  # % of courses with prerequisites
         float_str(major_units / total_units),  # % of units in major
         # Flags
         bool_str(total_units < 180),  # Under 180 units?
         bool_str(total_units > 200),  # Over 200 units?
         # Has > 16-unit term?
-        bool_str(any(term.credit_hours > 16 for term in degree_plan.terms)),
+        bool_str(any(units > 16 for units in term_units)),
         # Has < 12-unit term?
-        bool_str(any(term.credit_hours < 12 for term in degree_plan.terms)),
+        bool_str(any(units < 12 for units in term_units)),
         significant_difference,  # Has > 6 unit difference across colleges?
     )
 
 
-def main() -> None:
+def major_rows(unit: Tuple[int, str]) -> str:
+    """
+    Returns the CSV rows for every college's plan of a major.
+    """
+    year, major = unit
+    plans = major_plans(year)[major]
+    writer = CsvWriter(len(HEADER))
+    metrics = metrics_for_major(plans)
+    plan_units = [
+        course.units
+        for college in university.college_codes
+        if college in plans.colleges
+        for course in plans.plan(college)
+    ]
+    significant_difference = bool_str(max(plan_units) - min(plan_units) > 6)
+
+    for college in university.college_codes:
+        if college not in plans.colleges:
+            continue
+        write_row(
+            writer,
+            year,
+            major,
+            college,
+            plans,
+            metrics[college],
+            significant_difference,
+        )
+    return writer.done()
+
+
+def main(jobs: int = 1) -> None:
+    """
+    `jobs` is the number of processes to compute metrics in. Each (year, major)
+    is computed separately, and the rows are written in the same order
+    regardless of `jobs`.
+    """
+    units: List[Tuple[int, str]] = [
+        (year, major)
+        for year, majors in load_all_plans().by_year()
+        for major in majors.keys()
+    ]
+
     with open("./files/metrics_fa12_py.csv", "w") as file:
         writer = CsvWriter(len(HEADER), file)
         writer.row(*HEADER)
-
-        for year in range(2015, 2050):
-            majors = major_plans(year)
-            if majors == {}:
-                break
-            for major, plans in majors.items():
-                output = MajorOutput(plans)
-                plan_units = [
-                    course.units
-                    for college in university.college_codes
-                    if college in plans.colleges
-                    for course in plans.plan(college)
-                ]
-                significant_difference = bool_str(max(plan_units) - min(plan_units) > 6)
-
-                for college in university.college_codes:
-                    if college not in plans.colleges:
-                        continue
-                    write_row(
-                        writer,
-                        year,
-                        major,
-                        college,
-                        plans,
-                        output,
-                        significant_difference,
-                    )
+        with map_jobs(major_rows, units, jobs, chunksize=4) as results:
+            for rows in results:
+                file.write(rows)
 
 
 if __name__ == "__main__":
-    main()
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Compute metrics for every degree plan.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes to compute metrics in. Default: 1",
+    )
+    main(parser.parse_args().jobs)
@@ -0,0 +1,339 @@
+"""
+A prerequisite graph for a single term, for scripts that need to follow chains
+of prerequisites rather than just look up a course's direct prerequisites.
+
+Courses are numbered with integer IDs, and edges are stored in compressed
+sparse row (CSR) form: the prerequisites of course `i` are
+`prereq_targets[prereq_offsets[i]:prereq_offsets[i + 1]]`, and likewise for
+dependents. Every alternative of every requirement counts as an edge, i.e. the
+graph ignores the difference between AND and OR.
+
+Transitive closures are computed once per graph and stored as bitsets (Python
+ints where bit `i` is set if course `i` is in the set). A graph built from the
+previous term's graph shares its course IDs, so only the closures that the
+changed prereqs could affect are recomputed.
+
+Exports:
+    `PrereqGraph`, the graph.
+
+    `prereq_graph`, which gets the (cached) graph for a term.
+"""
+
+from array import array
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from parse import prereqs
+from parse_defs import CourseCode, Prerequisite
+
+__all__ = ["PrereqGraph", "prereq_graph"]
+
+
+def _closure(
+    offsets: "array[int]",
+    targets: "array[int]",
+    known: Optional[List[int]] = None,
+    stale: int = 0,
+) -> List[int]:
+    """
+    Returns, for every node, the bitset of nodes reachable from it by following
+    one or more edges. A node only reaches itself if it's part of a cycle.
+
+    Uses Tarjan's algorithm so cycles (which do exist in the prereq data) are
+    handled; strongly connected components come out with the components they
+    reach already finished, so each node is only visited once.
+
+    `known` optionally has closures that are already known for the first
+    `len(known)` nodes, except for those in the `stale` bitset. A known node
+    must only reach other known nodes.
+    """
+    node_count = len(offsets) - 1
+    reach = [0] * node_count
+    index = [-1] * node_count
+    low = [0] * node_count
+    on_stack = [False] * node_count
+    stack: List[int] = []
+    counter = 0
+    if known is not None:
+        # Known nodes count as finished components, so the search stops there
+        for node, bits in enumerate(known):
+            if not stale >> node & 1:
+                reach[node] = bits
+                index[node] = counter
+                counter += 1
+    for root in range(node_count):
+        if index[root] != -1:
+            continue
+        # Iterative DFS; each frame is a node and the next edge to visit
+        frames = [(root, offsets[root])]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while frames:
+            node, edge = frames[-1]
+            if edge < offsets[node + 1]:
+                frames[-1] = node, edge + 1
+                target = targets[edge]
+                if index[target] == -1:
+                    index[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack[target] = True
+                    frames.append((target, offsets[target]))
+                elif on_stack[target] and index[target] < low[node]:
+                    low[node] = index[target]
+                continue
+            frames.pop()
+            if frames and low[node] < low[frames[-1][0]]:
+                low[frames[-1][0]] = low[node]
+            if low[node] != index[node]:
+                continue
+            # `node` is the root of a component; pop it off the stack
+            members = 0
+            component: List[int] = []
+            while True:
+                member = stack.pop()
+                on_stack[member] = False
+                component.append(member)
+                members |= 1 << member
+                if member == node:
+                    break
+            bits = 0
+            cyclic = len(component) > 1
+            for member in component:
+                for edge in range(offsets[member], offsets[member + 1]):
+                    target = targets[edge]
+                    if members >> target & 1:
+                        cyclic = True
+                    else:
+                        bits |= (1 << target) | reach[target]
+            if cyclic:
+                bits |= members
+            for member in component:
+                reach[member] = bits
+    return reach
+
+
+def _stale(
+    old_offsets: "array[int]",
+    old_targets: "array[int]",
+    new_offsets: "array[int]",
+    new_targets: "array[int]",
+    reverse_offsets: "array[int]",
+    reverse_targets: "array[int]",
+) -> int:
+    """
+    Returns the bitset of nodes whose closure might differ between an old and a
+    new graph over the same node IDs: the nodes whose edges changed, and every
+    node that reaches them in the old graph. `reverse_offsets` and
+    `reverse_targets` are the old graph with its edges reversed.
+
+    Any other node only reaches edges that both graphs share, so its closure is
+    the same in both.
+    """
+    stale = 0
+    queue: List[int] = []
+    for node in range(len(old_offsets) - 1):
+        if (
+            old_targets[old_offsets[node] : old_offsets[node + 1]]
+            != new_targets[new_offsets[node] : new_offsets[node + 1]]
+        ):
+            stale |= 1 << node
+            queue.append(node)
+    while queue:
+        node = queue.pop()
+        for edge in range(reverse_offsets[node], reverse_offsets[node + 1]):
+            source = reverse_targets[edge]
+            if not stale >> source & 1:
+                stale |= 1 << source
+                queue.append(source)
+    return stale
+
+
+class PrereqGraph:
+    """
+    `codes[i]` is the course code of course `i`. `offered` is the bitset of
+    courses listed in the term's prereqs; the rest are courses that are only
+    ever listed as a prerequisite, so they don't exist that term, or that only
+    existed in the graph's previous terms.
+    """
+
+    codes: List[CourseCode]
+    ids: Dict[CourseCode, int]
+    offered: int
+    prereq_offsets: "array[int]"
+    prereq_targets: "array[int]"
+    dependent_offsets: "array[int]"
+    dependent_targets: "array[int]"
+    # Closures from the previous graph that haven't been reused yet, by name,
+    # with the bitset of nodes whose closures need recomputing
+    _reusable: Dict[str, Tuple[List[int], int]]
+
+    def __init__(
+        self,
+        all_reqs: Dict[CourseCode, List[List[Prerequisite]]],
+        previous: Optional["PrereqGraph"] = None,
+    ) -> None:
+        """
+        `previous` is an optional graph for another term, such as the previous
+        term. Prereqs rarely change between terms, so this graph keeps the
+        course IDs of `previous` and reuses whichever closures `previous` has
+        already computed, only recomputing them for courses that reach a course
+        whose prereqs changed.
+        """
+        if previous is None:
+            self.codes = list(all_reqs.keys())
+        else:
+            self.codes = previous.codes + [
+                code for code in all_reqs.keys() if code not in previous.ids
+            ]
+        self.ids = {code: i for i, code in enumerate(self.codes)}
+        self.offered = self.to_bits(self.ids[code] for code in all_reqs.keys())
+        for reqs in all_reqs.values():
+            for req in reqs:
+                for alt in req:
+                    if alt.course_code not in self.ids:
+                        self.ids[alt.course_code] = len(self.codes)
+                        self.codes.append(alt.course_code)
+
+        # Courses that don't exist have no prereqs
+        self.prereq_offsets = array("i", [0])
+        self.prereq_targets = array("i")
+        for code in self.codes:
+            seen: Set[int] = set()
+            for req in all_reqs.get(code, []):
+                for alt in req:
+                    target = self.ids[alt.course_code]
+                    if target not in seen:
+                        seen.add(target)
+                        self.prereq_targets.append(target)
+            self.prereq_offsets.append(len(self.prereq_targets))
+
+        # Counting sort the edges by prereq to get the dependent edges
+        counts = [0] * (len(self.codes) + 1)
+        for target in self.prereq_targets:
+            counts[target + 1] += 1
+        for i in range(len(self.codes)):
+            counts[i + 1] += counts[i]
+        self.dependent_offsets = array("i", counts)
+        self.dependent_targets = array("i", [0]) * len(self.prereq_targets)
+        for course in range(len(self.codes)):
+            for edge in range(
+                self.prereq_offsets[course], self.prereq_offsets[course + 1]
+            ):
+                target = self.prereq_targets[edge]
+                self.dependent_targets[counts[target]] = course
+                counts[target] += 1
+
+        self._reusable = {}
+        if previous is None:
+            return
+        # A course's ancestors change if it reaches a course whose prereqs
+        # changed; its descendants change if it reaches a course whose
+        # dependents changed. Reaching is checked in the previous graph
+        if "ancestors" in previous.__dict__:
+            self._reusable["ancestors"] = previous.ancestors, _stale(
+                previous.prereq_offsets,
+                previous.prereq_targets,
+                self.prereq_offsets,
+                self.prereq_targets,
+                previous.dependent_offsets,
+                previous.dependent_targets,
+            )
+        if "descendants" in previous.__dict__:
+            self._reusable["descendants"] = previous.descendants, _stale(
+                previous.dependent_offsets,
+                previous.dependent_targets,
+                self.dependent_offsets,
+                self.dependent_targets,
+                previous.prereq_offsets,
+                previous.prereq_targets,
+            )
+
+    def exists(self, course_code: CourseCode) -> bool:
+        """
+        Whether the course is offered this term, i.e. whether it has its own
+        prereqs entry, even an empty one.
+        """
+        course_id = self.ids.get(course_code)
+        return course_id is not None and bool(self.offered >> course_id & 1)
+
+    def prereqs(self, course_id: int) -> "array[int]":
+        return self.prereq_targets[
+            self.prereq_offsets[course_id] : self.prereq_offsets[course_id + 1]
+        ]
+
+    def dependents(self, course_id: int) -> "array[int]":
+        return self.dependent_targets[
+            self.dependent_offsets[course_id] : self.dependent_offsets[course_id + 1]
+        ]
+
+    @cached_property
+    def ancestors(self) -> List[int]:
+        """
+        Bitsets of every course that each course transitively requires.
+        """
+        known, stale = self._reusable.pop("ancestors", (None, 0))
+        return _closure(
+            self.prereq_offsets, self.prereq_targets, known=known, stale=stale
+        )
+
+    @cached_property
+    def descendants(self) -> List[int]:
+        """
+        Bitsets of every course that transitively requires each course, i.e.
+        the courses it blocks.
+        """
+        known, stale = self._reusable.pop("descendants", (None, 0))
+        return _closure(
+            self.dependent_offsets, self.dependent_targets, known=known, stale=stale
+        )
+
+    def to_codes(self, bits: int) -> Iterable[CourseCode]:
+        """
+        Lists the course codes in a bitset in ID order.
+        """
+        while bits:
+            lowest = bits & -bits
+            yield self.codes[lowest.bit_length() - 1]
+            bits ^= lowest
+
+    def to_bits(self, course_ids: Iterable[int]) -> int:
+        bits = 0
+        for course_id in course_ids:
+            bits |= 1 << course_id
+        return bits
+
+    def ancestor_codes(self, course_code: CourseCode) -> Set[CourseCode]:
+        course_id = self.ids.get(course_code)
+        if course_id is None:
+            return set()
+        return set(self.to_codes(self.ancestors[course_id]))
+
+    def blocked_count(self, course_code: CourseCode) -> int:
+        """
+        The number of other courses that transitively require the course.
+        """
+        course_id = self.ids[course_code]
+        return (self.descendants[course_id] & ~(1 << course_id)).bit_count()
+
+    def redundant_prereqs(self, course_code: CourseCode) -> List[CourseCode]:
+        """
+        Lists the course's direct prereqs that are also required by its other
+        prereqs, in ID order.
+        """
+        direct = self.to_bits(self.prereqs(self.ids[course_code]))
+        implied = 0
+        for prereq in self.prereqs(self.ids[course_code]):
+            implied |= self.ancestors[prereq]
+        return list(self.to_codes(direct & implied))
+
+
+_graph_cache: Dict[str, PrereqGraph] = {}
+
+
+def prereq_graph(term: str) -> PrereqGraph:
+    if term not in _graph_cache:
+        _graph_cache[term] = PrereqGraph(prereqs(term))
+    return _graph_cache[term]
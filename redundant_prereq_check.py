@@ -1,6 +1,7 @@
 from typing import Dict, Set
 from parse import major_plans, prereqs
 from parse_defs import CourseCode
+from prereq_graph import prereq_graph
 
 flattened = {
     course_code: {
@@ -8,14 +9,7 @@ flattened = {
     }
     for course_code, requirements in prereqs("FA21").items()
 }
-
-
-def get_nested_prereqs(code: CourseCode, cache: Set[CourseCode]) -> None:
-    if code not in cache:
-        if code in flattened:
-            cache |= flattened[code]
-            for prereq in flattened[code]:
-                get_nested_prereqs(prereq, cache)
+graph = prereq_graph("FA21")
 
 
 redundancies: Dict[CourseCode, Set[CourseCode]] = {}
@@ -23,7 +17,7 @@ redundancies: Dict[CourseCode, Set[CourseCode]] = {}
 for course_code, requisites in flattened.items():
     prereqs_of_prereqs: Set[CourseCode] = set()
     for prereq in requisites:
-        get_nested_prereqs(prereq, prereqs_of_prereqs)
+        prereqs_of_prereqs |= graph.ancestor_codes(prereq)
     redundant = {code for code in requisites if code in prereqs_of_prereqs}
     if course_code == ("MATH", "10B"):
         print(prereqs_of_prereqs)
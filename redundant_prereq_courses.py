@@ -6,6 +6,7 @@ python3 redundant_prereq_courses.py txt > files/redundant_prereq_courses.txt
 from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 from parse import prereqs
 from parse_defs import CourseCode
+from prereq_graph import prereq_graph
 from util import add_entry, merge_partition, sorted_dict
 
 # PHYS 1B requires [MATH 10B, MATH 20B], among others. PHYS 2B requires [MATH
@@ -18,6 +19,7 @@ from util import add_entry, merge_partition, sorted_dict
 # I'll just assume that *every* alternative is taken.
 
 course_prereqs = prereqs("FA22")
+graph = prereq_graph("FA22")
 course_prereqs_flat = {
     course_code: [alt.course_code for req in prereqs for alt in req]
     for course_code, prereqs in course_prereqs.items()
@@ -81,11 +83,12 @@ def main(csv: bool = True) -> None:
     if not csv:
         print()
 
-    nonexistent: Dict[CourseCode, List[PrereqChain]] = {}
     for course_code in sorted(course_prereqs_flat.keys(), key=CourseCode.parts):
-        redundant = redundant_prereqs(course_code, nonexistent)
-        if not redundant:
+        # Only search for the prereq chains of courses that the graph says have
+        # a redundant prereq
+        if not graph.redundant_prereqs(course_code):
             continue
+        redundant = redundant_prereqs(course_code)
         if not csv:
             print(f"[{course_code}]")
         for course, chains in sorted_dict(redundant, key=CourseCode.parts):
@@ -112,10 +115,16 @@ def main(csv: bool = True) -> None:
     if not csv:
         print()
 
-    for course, chains in sorted_dict(nonexistent):
-        display_chains = ", ".join(
-            map(str, sorted({satisfies for satisfies, *_ in chains}))
-        )
+    # Every course that directly requires a nonexistent course
+    nonexistent = {
+        graph.codes[course_id]: {
+            graph.codes[dependent] for dependent in graph.dependents(course_id)
+        }
+        for course_id in range(len(graph.codes))
+        if not graph.offered >> course_id & 1
+    }
+    for course, required_by in sorted_dict(nonexistent):
+        display_chains = ", ".join(map(str, sorted(required_by)))
         if csv:
             print(f'Nonexistent course,{course},"{display_chains}",')
         else:
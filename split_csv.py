@@ -1,27 +1,40 @@
 """
 Split the prereq and plan files into smaller, header-less files so they're
-faster to parse.
+faster to parse. Each split file also gets a binary sidecar (see `columnar.py`),
+which `parse.py` reads instead of the CSV. Splitting the plans also writes a
+table of cleaned course titles (see `university.write_title_table`).
 
-python3 prereqs files/prereqs_fa23.csv
-python3 plans files/academic_plans_fa23.csv
+The source file doesn't need to be sorted: rows are appended to their group's
+file in the order they appear, and only a limited number of files are kept
+open at a time. With `--jobs`, the source is split into byte ranges that are
+processed in parallel, which assumes no cell contains a line break.
+
+python3 split_csv.py prereqs files/prereqs_fa23.csv
+python3 split_csv.py plans files/academic_plans_fa23.csv
+python3 split_csv.py prereqs files/prereqs_fa23.csv --jobs 4
 """
 
 from abc import abstractmethod
+from collections import OrderedDict
 import csv
 import os
-from shutil import rmtree
+from shutil import copyfileobj, rmtree
 from typing import (
     Dict,
     Generic,
     Hashable,
+    Iterable,
+    Iterator,
     List,
     NamedTuple,
-    Optional,
+    Set,
     Tuple,
     TypeVar,
 )
 
-from util import CsvWriter
+import columnar
+from university import write_title_table
+from util import CsvWriter, map_jobs
 
 T = TypeVar("T", bound=Hashable)
 
@@ -35,6 +48,16 @@ class Grouper(Generic[T]):
     def file_name(self, group: T) -> str:
         pass
 
+    @abstractmethod
+    def write_sidecar(self, path: str) -> None:
+        pass
+
+    def finish(self, dir_path: str, paths: List[str]) -> None:
+        """
+        Called once all the split files and sidecars have been written.
+        """
+        pass
+
 
 class PrereqGrouper(Grouper[str]):
     def group(self, row: List[str]) -> str:
@@ -43,6 +66,9 @@ class PrereqGrouper(Grouper[str]):
     def file_name(self, group: str) -> str:
         return f"prereqs_{group}.csv"
 
+    def write_sidecar(self, path: str) -> None:
+        columnar.write_prereqs(path)
+
 
 class PlanGrouper(Grouper[Tuple[int, int]]):
     def group(self, row: List[str]) -> Tuple[int, int]:
@@ -52,60 +78,221 @@ class PlanGrouper(Grouper[Tuple[int, int]]):
         year, length = group
         return f"plans_{year}_{length}yr.csv"
 
+    def write_sidecar(self, path: str) -> None:
+        columnar.write_plans(path)
+
+    def finish(self, dir_path: str, paths: List[str]) -> None:
+        titles: Set[str] = set()
+        for path in paths:
+            with open(path, newline="") as file:
+                titles.update(row[3] for row in csv.reader(file))
+        write_title_table(dir_path + "titles.json", sorted(titles))
+
 
 class Options(NamedTuple, Generic[T]):
     source: str
     dir_path: str
     grouper: Grouper[T]
+    jobs: int = 1
+    max_open: int = 32
 
 
-def main(options: "Options[T]") -> None:
+class WriterPool(Generic[T]):
+    """
+    Writes rows to one file per group, keeping at most `max_open` files open.
+    The least recently used file is closed when another needs to be opened, and
+    files are reopened in append mode, so rows can come in any order.
+
+    `columns` maps each group seen so far to the number of columns of its first
+    row, in the order the groups were first seen. Every row of a group is
+    padded or truncated to that many columns.
+    """
+
+    columns: Dict[T, int]
+    _dir_path: str
+    _grouper: Grouper[T]
+    _max_open: int
+    _open: "OrderedDict[T, CsvWriter]"
+
+    def __init__(self, dir_path: str, grouper: Grouper[T], max_open: int) -> None:
+        self.columns = {}
+        self._dir_path = dir_path
+        self._grouper = grouper
+        self._max_open = max_open
+        self._open = OrderedDict()
+
+    def row(self, row: List[str]) -> None:
+        group = self._grouper.group(row)
+        writer = self._open.get(group)
+        if writer is None:
+            if len(self._open) >= self._max_open:
+                _, oldest = self._open.popitem(last=False)
+                oldest.done()
+            cols = self.columns.setdefault(group, len(row))
+            # The directory starts out empty, so appending also creates files
+            writer = self._open[group] = CsvWriter(
+                cols, open(self._dir_path + self._grouper.file_name(group), "a")
+            )
+        else:
+            self._open.move_to_end(group)
+        writer.row(*row)
+
+    def done(self) -> None:
+        for writer in self._open.values():
+            writer.done()
+        self._open.clear()
+
+
+def _reset_dir(dir_path: str) -> None:
     try:
-        rmtree(options.dir_path)
+        rmtree(dir_path)
     except FileNotFoundError:
         pass
-    os.makedirs(options.dir_path)
-    writers: Dict[T, CsvWriter] = {}
+    os.makedirs(dir_path)
+
+
+def _byte_ranges(path: str, count: int) -> List[Tuple[int, int]]:
+    size = os.path.getsize(path)
+    bounds = [size * i // count for i in range(count + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def _read_range(path: str, start: int, end: int) -> Iterator[str]:
+    """
+    Yields the lines that start in the byte range `[start, end)`, except the
+    header.
+    """
+    with open(path, "rb") as file:
+        if start == 0:
+            file.readline()
+        else:
+            # The line that `start` is in belongs to the previous range
+            file.seek(start - 1)
+            file.readline()
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            yield line.decode("utf-8")
+
+
+class _RangeJob(NamedTuple, Generic[T]):
+    options: "Options[T]"
+    part_path: str
+    start: int
+    end: int
+
+
+def _split_range(job: "_RangeJob[T]") -> List[T]:
+    """
+    Runs in a worker process and splits a byte range of the source into a
+    directory of its own.
+    """
+    _reset_dir(job.part_path)
+    pool = WriterPool(job.part_path, job.options.grouper, job.options.max_open)
+    for row in csv.reader(_read_range(job.options.source, job.start, job.end)):
+        pool.row(row)
+    pool.done()
+    return list(pool.columns.keys())
+
+
+def _write_sidecar(args: Tuple[Grouper[T], str]) -> None:
+    grouper, path = args
+    grouper.write_sidecar(path)
+
+
+def split_serial(options: "Options[T]") -> Iterable[T]:
+    pool = WriterPool(options.dir_path, options.grouper, options.max_open)
     with open(options.source, newline="") as file:
         reader = csv.reader(file)
         # Skip header
         next(reader)
-        last_group: Optional[T] = None
         for row in reader:
-            group = options.grouper.group(row)
-            if group != last_group:
-                writers[group] = CsvWriter(
-                    len(row),
-                    open(options.dir_path + options.grouper.file_name(group), "w"),
-                )
-                last_group = group
-            writers[group].row(*row)
-    for writer in writers.values():
-        writer.done()
-    with open(options.dir_path + ".done", "w") as file:
+            pool.row(row)
+    pool.done()
+    return pool.columns.keys()
+
+
+def split_parallel(options: "Options[T]") -> Iterable[T]:
+    part_paths = [f"{options.dir_path}.part{i}/" for i in range(options.jobs)]
+    jobs = [
+        _RangeJob(options, part_path, start, end)
+        for part_path, (start, end) in zip(
+            part_paths, _byte_ranges(options.source, options.jobs)
+        )
+    ]
+    with map_jobs(_split_range, jobs, options.jobs) as results:
+        part_groups = [set(groups) for groups in results]
+    groups = {group: None for part in part_groups for group in part}
+    # Concatenate each group's parts in order, so the rows end up in the same
+    # order as they would if the file were split serially
+    for group in groups.keys():
+        file_name = options.grouper.file_name(group)
+        with open(options.dir_path + file_name, "wb") as output:
+            for part_path, part in zip(part_paths, part_groups):
+                if group in part:
+                    with open(part_path + file_name, "rb") as part_file:
+                        copyfileobj(part_file, output)
+    for part_path in part_paths:
+        rmtree(part_path)
+    return groups.keys()
+
+
+def main(options: "Options[T]") -> None:
+    _reset_dir(options.dir_path)
+    if options.jobs > 1:
+        groups = split_parallel(options)
+    else:
+        groups = split_serial(options)
+    paths = [options.dir_path + options.grouper.file_name(group) for group in groups]
+    with map_jobs(
+        _write_sidecar, [(options.grouper, path) for path in paths], options.jobs
+    ) as results:
+        for _ in results:
+            pass
+    options.grouper.finish(options.dir_path, paths)
+    with open(options.dir_path + ".done", "w"):
         pass
 
 
 if __name__ == "__main__":
-    import sys
+    from argparse import ArgumentParser
 
-    if len(sys.argv) < 3:
-        print("python3 (prereqs|plans) <path>")
-    elif sys.argv[1] == "prereqs":
+    parser = ArgumentParser(
+        description="Split the prereq or plan CSV file into one file per term or plan year."
+    )
+    parser.add_argument("kind", choices=["prereqs", "plans"])
+    parser.add_argument("path", help="Path to the CSV file to split.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes to split the file with. Assumes no cell contains a line break if more than 1. Default: 1",
+    )
+    parser.add_argument(
+        "--max-open",
+        type=int,
+        default=32,
+        help="Maximum number of split files to keep open at a time. Default: 32",
+    )
+    args = parser.parse_args()
+    if args.kind == "prereqs":
         main(
             Options(
-                source=sys.argv[2],
+                source=args.path,
                 dir_path="./files/prereqs/",
                 grouper=PrereqGrouper(),
+                jobs=args.jobs,
+                max_open=args.max_open,
             )
         )
-    elif sys.argv[1] == "plans":
+    else:
         main(
             Options(
-                source=sys.argv[2],
+                source=args.path,
                 dir_path="./files/plans/",
                 grouper=PlanGrouper(),
+                jobs=args.jobs,
+                max_open=args.max_open,
             )
         )
-    else:
-        print("python3 (prereqs|plans) <path>")
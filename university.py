@@ -1,6 +1,9 @@
+from functools import lru_cache
+import hashlib
 from itertools import chain
+import json
 import re
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from parse_defs import CourseCode, Prerequisite, ProcessedCourse, RawCourse, TermCode
 
@@ -13,6 +16,12 @@ ParsedCourseCodes = List[Tuple[Optional[CourseCode], float]]
 non_subjects: Set[str] = {"IE", "RR", "OR", "TE", "DEPT"}
 
 
+_df_re = re.compile(r"DF-?\d - ")
+_course_code_re = re.compile(
+    r"\b([A-Z]{2,4}) ?(\d+[A-Z]{0,2})(?: ?[&/] ?\d*[A-Z]([LX]))?\b"
+)
+
+
 def parse_course_name(
     name: str,
     units: float,
@@ -38,10 +47,8 @@ def parse_course_name(
         return [(None, units)]
     if name.startswith("ADV CHEM"):
         return [(None, units)]
-    name = re.sub(r"DF-?\d - ", "", name)
-    match = re.search(
-        r"\b([A-Z]{2,4}) ?(\d+[A-Z]{0,2})(?: ?[&/] ?\d*[A-Z]([LX]))?\b", name
-    )
+    name = _df_re.sub("", name)
+    match = _course_code_re.search(name)
     if match:
         subject, number, has_lab = match.group(1, 2, 3)
         # TDHT 1XX etc are not valid course codes (there are no real course
@@ -67,32 +74,101 @@ control_chars = re.escape(
 )
 
 
+# Applied in order by `clean_course_title`
+_junk_re = re.compile(r"[*^~.#+=¹%s]+|<..?>" % control_chars)
+_writing_req_re = re.compile(r"\s*/\s*(AWPE?|A?ELWR|SDCC)")
+_or_re = re.compile(r"\s+OR\s+|\s*/\s*")
+_dash_re = re.compile(r"-+")
+_spaces_re = re.compile(r" +")
+_note_re = re.compile(r" ?\( ?(GE SEE|NOTE|FOR|SEE|REQUIRES|ONLY|OFFERED)[^)]*\)")
+_leading_number_re = re.compile(r"^\d+ ")
+_elect_re = re.compile(r"ELECT?\b")
+_parens_re = re.compile(r"[()]")
+_tech_re = re.compile(r"TECH\b")
+_require_re = re.compile(r"REQUIRE\b")
+_bio_re = re.compile(r"BIO\b")
+_biophys_re = re.compile(r"BIOPHYS\b")
+
+
 def clean_course_title(title: str) -> str:
     """
     Cleans up the course title by removing asterisks and (see note)s.
     """
-    title = re.sub(r"[*^~.#+=¹%s]+|<..?>" % control_chars, "", title)
+    title = _junk_re.sub("", title)
     title = title.strip()
-    title = re.sub(r"\s*/\s*(AWPE?|A?ELWR|SDCC)", "", title)
+    title = _writing_req_re.sub("", title)
     title = title.upper()
-    title = re.sub(r"\s+OR\s+|\s*/\s*", " / ", title)
-    title = re.sub(r"-+", " - ", title)
-    title = re.sub(r" +", " ", title)
-    title = re.sub(
-        r" ?\( ?(GE SEE|NOTE|FOR|SEE|REQUIRES|ONLY|OFFERED)[^)]*\)", "", title
-    )
-    title = re.sub(r"^\d+ ", "", title)
-    title = re.sub(r"ELECT?\b", "ELECTIVE", title)
+    title = _or_re.sub(" / ", title)
+    title = _dash_re.sub(" - ", title)
+    title = _spaces_re.sub(" ", title)
+    title = _note_re.sub("", title)
+    title = _leading_number_re.sub("", title)
+    title = _elect_re.sub("ELECTIVE", title)
     title = title.replace(" (VIS)", "")
     if title.startswith("NE ELECTIVE "):
-        title = re.sub(r"[()]", "", title)
-    title = re.sub(r"TECH\b", "TECHNICAL", title)
-    title = re.sub(r"REQUIRE\b", "REQUIREMENT", title)
-    title = re.sub(r"BIO\b", "BIOLOGY", title)
-    title = re.sub(r"BIOPHYS\b", "BIOPHYSICS", title)
+        title = _parens_re.sub("", title)
+    title = _tech_re.sub("TECHNICAL", title)
+    title = _require_re.sub("REQUIREMENT", title)
+    title = _bio_re.sub("BIOLOGY", title)
+    title = _biophys_re.sub("BIOPHYSICS", title)
     return title
 
 
+def _source_hash() -> str:
+    """
+    Identifies the version of this file, so title tables made by an older
+    version of `clean_course_title` aren't used.
+    """
+    with open(__file__, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def write_title_table(path: str, titles: Iterable[str]) -> None:
+    """
+    Saves the cleaned version of each raw course title so `process_plan` can
+    look them up instead of cleaning them again.
+    """
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "source": _source_hash(),
+                "titles": {title: clean_course_title(title) for title in titles},
+            },
+            file,
+        )
+
+
+_title_table: Optional[Dict[str, str]] = None
+
+
+def _get_title_table(path: str) -> Dict[str, str]:
+    global _title_table
+    if _title_table is not None:
+        return _title_table
+    titles: Dict[str, str] = {}
+    try:
+        with open(path) as file:
+            table = json.load(file)
+        if table["source"] == _source_hash():
+            titles = table["titles"]
+    except FileNotFoundError:
+        pass
+    _title_table = titles
+    return titles
+
+
+@lru_cache(maxsize=16384)
+def clean_and_parse(title: str, units: float) -> Tuple[str, ParsedCourseCodes]:
+    """
+    `clean_course_title` followed by `parse_course_name`, memoized because the
+    same titles appear in many plans. The result must not be modified.
+    """
+    cleaned = _get_title_table(university.titles_file).get(title)
+    if cleaned is None:
+        cleaned = clean_course_title(title)
+    return cleaned, parse_course_name(cleaned, units)
+
+
 class _UCSD:
     name = "University of California, San Diego"
     term_type = "Quarter"
@@ -100,6 +176,8 @@ class _UCSD:
     "Used for mapping term indices to term codes"
 
     majors_file = "./files/isis_major_code_list.csv"
+    titles_file = "./files/plans/titles.json"
+    "Written by `split_csv.py` when it splits the plans; see `write_title_table`"
 
     curriculum_priority = ["TH", "WA", "SN", "MU", "FI", "RE", "SI", "EI"]
     "College codes from least to most weird colleges (see #14)"
@@ -130,8 +208,7 @@ class _UCSD:
     def process_plan(self, plan: List[RawCourse]) -> List[ProcessedCourse]:
         courses: List[ProcessedCourse] = []
         for course in plan:
-            title = clean_course_title(course.course_title)
-            parsed = parse_course_name(title, course.units)
+            title, parsed = clean_and_parse(course.course_title, course.units)
             term = course.year * 4 + course.quarter
             for course_code, units in parsed:
                 courses.append(
@@ -3,29 +3,41 @@ Automatically uploads a curriculum and each college's degree plan to Curricular
 Analytics.
 
 To authenticate yourself, it uses the `AUTHENTICITY_TOKEN` and `CA_SESSION`
-environment variables. See the README for how to get them.
+environment variables. See the README for how to get them. Set `CA_HOST` to
+upload to somewhere other than https://curricularanalytics.org, such as a local
+stand-in server.
 
 Exports:
     `upload_major`, which takes a major code, the organization ID, the catalog
     year, and your initials. It creates and uploads the curriculum and degree
     plans for the major to the organization on Curricular Analytics. Your
     initials are used to sign the CSV file names.
+
+    `upload_majors`, which uploads several majors at once and records each
+    major's curriculum in `files/uploaded<year>.yml` as soon as it's done.
+
+python3 upload.py --year 2023 --track CS25
+python3 upload.py --year 2023 --all --jobs 4
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 import os
-from typing import Dict, Generator, Optional
+import sys
+from typing import Dict, Generator, List, Optional
 
 from dotenv import load_dotenv  # type: ignore
 
-from api import Session
+from api import HOST, Session
 from output import MajorOutput
 from parse import MajorInfo, major_codes, major_plans
 from university import university
 
 Uploaded = Dict[str, int]
 
-__all__ = ["MajorUploader"]
+URL_BASE = "https://curricularanalytics.org/curricula/"
+
+__all__ = ["MajorUploader", "track_uploaded_curricula", "upload_majors"]
 
 load_dotenv()
 
@@ -44,7 +56,9 @@ class MajorUploader(Session):
             raise EnvironmentError(
                 f"There is no `CA_SESSION` environment variable defined. See the README to see how to set up `.env`."
             )
-        super().__init__(session, os.getenv("AUTHENTICITY_TOKEN"))
+        super().__init__(
+            session, os.getenv("AUTHENTICITY_TOKEN"), os.getenv("CA_HOST") or HOST
+        )
 
     def upload_major(
         self,
@@ -66,15 +80,16 @@ class MajorUploader(Session):
         """
         major_code = major.isis_code
         output = MajorOutput(major_plans(year)[major_code])
+        name = f"{year} {major_code}-{major.name}"
         self.upload_curriculum(
             organization_id,
-            f"{year} {major_code}-{major.name}",
+            name,
             year,
             (f"{initials}-Curriculum Plan-{major_code}.csv", output.output()),
         )
         if log:
             print(f"[{major_code}] Curriculum uploaded")
-        curriculum_id = self.get_curricula(4, direction="desc")[0].curriculum_id()
+        curriculum_id = self.find_curriculum(name)
         if log:
             print(
                 f"[{major_code}] Curriculum URL: https://curricularanalytics.org/curricula/{curriculum_id}/graph"
@@ -106,16 +121,17 @@ class MajorUploader(Session):
         """
         major_code = major.isis_code
         output = MajorOutput(major_plans(year)[major_code])
+        name = f"{year} {major_code}-{major.name}"
         self.upload_curriculum(
             organization_id,
-            f"{year} {major_code}-{major.name}",
+            name,
             year,
             output.output_json(),
             major.cip_code,
         )
         if log:
             print(f"[{major_code}] Curriculum uploaded")
-        curriculum_id = self.get_curricula(4, direction="desc")[0].curriculum_id()
+        curriculum_id = self.find_curriculum(name)
         if log:
             print(
                 f"[{major_code}] Curriculum URL: https://curricularanalytics.org/curricula/{curriculum_id}/graph"
@@ -174,10 +190,12 @@ class MajorUploader(Session):
 
 
 @contextmanager
-def track_uploaded_curricula(year: int) -> Generator[Uploaded, None, None]:
+def track_uploaded_curricula(
+    year: int, path: Optional[str] = None
+) -> Generator[Uploaded, None, None]:
     """
     Caches the IDs of uploaded curricula on Curricular Analytics in a YAML file
-    at `files/uploaded<year>.yml`.
+    at `files/uploaded<year>.yml`, or `path` if given.
 
     Usage:
 
@@ -193,10 +211,9 @@ def track_uploaded_curricula(year: int) -> Generator[Uploaded, None, None]:
     Curricular Analytics do not have an entry in the dictionary. At the end of
     the `with` block, changes to `curricula` are saved back in the YAML file.
     """
-    URL_BASE = "https://curricularanalytics.org/curricula/"
     curricula: Uploaded = {}
     try:
-        with open(f"./files/uploaded{year}.yml") as file:
+        with open(path or f"./files/uploaded{year}.yml") as file:
             for line in file.read().splitlines():
                 major_code, curriculum_id = line.split(":", maxsplit=1)
                 curriculum_id = curriculum_id.strip()
@@ -211,13 +228,79 @@ def track_uploaded_curricula(year: int) -> Generator[Uploaded, None, None]:
         yield curricula
     finally:
         if original != curricula:
-            with open(f"./files/uploaded{year}.yml", "w") as file:
-                for major_code in major_plans(year).keys():
-                    curriculum_id = curricula.get(major_code)
-                    if curriculum_id is None:
-                        file.write(f"{major_code}:\n")
-                    else:
-                        file.write(f"{major_code}: {URL_BASE}{curriculum_id}/graph\n")
+            save_uploaded_curricula(year, curricula, path)
+
+
+def save_uploaded_curricula(
+    year: int, curricula: Uploaded, path: Optional[str] = None
+) -> None:
+    """
+    Writes the YAML file that `track_uploaded_curricula` reads. It's written to
+    a temporary file first so an interrupted upload never leaves it half
+    written.
+    """
+    path = path or f"./files/uploaded{year}.yml"
+    with open(path + ".tmp", "w") as file:
+        for major_code in major_plans(year).keys():
+            curriculum_id = curricula.get(major_code)
+            if curriculum_id is None:
+                file.write(f"{major_code}:\n")
+            else:
+                file.write(f"{major_code}: {URL_BASE}{curriculum_id}/graph\n")
+    os.replace(path + ".tmp", path)
+
+
+def upload_majors(
+    uploader: MajorUploader,
+    majors: List[MajorInfo],
+    organization_id: int,
+    year: int,
+    initials: str,
+    jobs: int = 4,
+    use_json: bool = False,
+    log: bool = False,
+    path: Optional[str] = None,
+) -> List[str]:
+    """
+    Uploads the majors with `upload_major` (or `upload_major_json` if
+    `use_json` is true), `jobs` majors at a time.
+
+    Each major's curriculum ID is saved to `files/uploaded<year>.yml` (or
+    `path`) as soon as the major is done, and majors already listed there are
+    skipped, so an interrupted upload can be resumed by running it again.
+    Individual requests are retried by `Session` (uploads only if they didn't go
+    through); a major that still fails is left out of the file, and its major
+    code is returned.
+    """
+
+    def upload(major: MajorInfo) -> int:
+        if use_json:
+            return uploader.upload_major_json(major, organization_id, year, log=log)
+        return uploader.upload_major(major, organization_id, year, initials, log=log)
+
+    failed: List[str] = []
+    with track_uploaded_curricula(year, path) as curricula:
+        pending: Dict[Future[int], MajorInfo] = {}
+        with ThreadPoolExecutor(jobs) as executor:
+            for major in majors:
+                if major.isis_code in curricula:
+                    if log:
+                        print(f"[{major.isis_code}] Already uploaded")
+                    continue
+                pending[executor.submit(upload, major)] = major
+            # Only this thread writes to the file
+            for future in as_completed(pending):
+                major_code = pending[future].isis_code
+                try:
+                    curricula[major_code] = future.result()
+                except Exception as error:
+                    print(f"[{major_code}] Failed to upload: {error}", file=sys.stderr)
+                    failed.append(major_code)
+                    continue
+                save_uploaded_curricula(year, curricula, path)
+                if log:
+                    print(f"[{major_code}] Done")
+    return failed
 
 
 if __name__ == "__main__":
@@ -238,7 +321,14 @@ if __name__ == "__main__":
     parser = ArgumentParser(
         description="Automatically upload a major's curriculum and degree plans onto Curricular Analytics."
     )
-    parser.add_argument("major_code", help="The ISIS code of the major to upload.")
+    parser.add_argument(
+        "major_codes", nargs="*", help="The ISIS codes of the majors to upload."
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Upload every major with plans that year that isn't in files/uploaded[year].yml yet. Implies --track",
+    )
     parser.add_argument(
         "--org",
         type=int,
@@ -257,12 +347,15 @@ if __name__ == "__main__":
     parser.add_argument(
         "--track",
         action="store_true",
-        help="Whether to keep track of uploaded curricula in files/uploaded[year].yml. Default: don't keep track",
+        help="Whether to keep track of uploaded curricula in files/uploaded[year].yml. Always on when uploading multiple majors. Default: don't keep track",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of majors to upload at a time. Default: 1",
     )
     args = parser.parse_args()
-    major_code: str = args.major_code
-    if major_code not in major_codes():
-        raise KeyError(f"{major_code} is not a major code that I know of.")
     org_id: Optional[int] = args.org
     if org_id is None:
         org_id = int(get_env("ORG_ID"))
@@ -272,19 +365,33 @@ if __name__ == "__main__":
     initials: Optional[str] = args.initials
     if initials is None:
         initials = get_env("INITIALS")
-    upload = lambda: (
-        MajorUploader().upload_major_json(
-            major_codes()[major_code], org_id, year, log=True
-        )
-        if args.json
-        else MajorUploader().upload_major(
-            major_codes()[major_code], org_id, year, initials, log=True
-        )
+    selected: List[str] = (
+        list(major_plans(year).keys()) if args.all else args.major_codes
     )
-    if args.track:
-        with track_uploaded_curricula(year) as curricula:
-            if major_code in curricula:
-                raise KeyError(f"{major_code} already uploaded")
-            curricula[major_code] = upload()
+    if not selected:
+        parser.error(
+            f"No plans for {year}." if args.all else "Need major codes or --all."
+        )
+    for major_code in selected:
+        if major_code not in major_codes():
+            raise KeyError(f"{major_code} is not a major code that I know of.")
+    if len(selected) == 1 and not args.all and not args.track:
+        major = major_codes()[selected[0]]
+        if args.json:
+            MajorUploader().upload_major_json(major, org_id, year, log=True)
+        else:
+            MajorUploader().upload_major(major, org_id, year, initials, log=True)
     else:
-        upload()
+        failed = upload_majors(
+            MajorUploader(),
+            [major_codes()[major_code] for major_code in selected],
+            org_id,
+            year,
+            initials,
+            args.jobs,
+            args.json,
+            log=True,
+        )
+        if failed:
+            print(f"Failed to upload {' '.join(failed)}", file=sys.stderr)
+            exit(1)
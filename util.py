@@ -3,13 +3,19 @@ Utility functions for a partitioned list, which is what I will call a dictionary
 that maps keys to lists of values with the same key.
 """
 
+from contextlib import contextmanager
 import csv
 from io import StringIO
+import json
+import multiprocessing
 from typing import (
     Any,
     Callable,
+    ContextManager,
     Dict,
+    Generator,
     Iterable,
+    Iterator,
     List,
     Optional,
     Protocol,
@@ -18,7 +24,6 @@ from typing import (
     TypeVar,
 )
 
-
 K = TypeVar("K")
 V = TypeVar("V")
 
@@ -132,6 +137,106 @@ class CsvWriter:
             return ""
 
 
+class JsonWriter:
+    """
+    Writes JSON to a file as it's produced, rather than building the whole
+    value in memory for `json.dump`. The output is the same as `json.dump` with
+    the same separators.
+
+    ```py
+    writer = JsonWriter(stdout)
+    with writer.object():
+        writer.item([1, 2], "numbers")
+        with writer.array("courses"):
+            for course in courses:
+                writer.item(course)
+    ```
+
+    Inside an object, every item needs a key.
+    """
+
+    _output: TextIO
+    _item_separator: str
+    _key_separator: str
+    # Whether each open object or array is still empty
+    _empty: List[bool]
+
+    def __init__(
+        self, output: TextIO, separators: Tuple[str, str] = (", ", ": ")
+    ) -> None:
+        self._output = output
+        self._item_separator, self._key_separator = separators
+        self._empty = []
+
+    def _start_item(self, key: Optional[str]) -> None:
+        if self._empty:
+            if self._empty[-1]:
+                self._empty[-1] = False
+            else:
+                self._output.write(self._item_separator)
+        if key is not None:
+            self._output.write(json.dumps(key) + self._key_separator)
+
+    def item(self, value: Any, key: Optional[str] = None) -> None:
+        self._start_item(key)
+        json.dump(
+            value,
+            self._output,
+            separators=(self._item_separator, self._key_separator),
+        )
+
+    @contextmanager
+    def _container(
+        self, key: Optional[str], start: str, end: str
+    ) -> Generator[None, None, None]:
+        self._start_item(key)
+        self._output.write(start)
+        self._empty.append(True)
+        yield
+        self._empty.pop()
+        self._output.write(end)
+
+    def object(self, key: Optional[str] = None) -> ContextManager[None]:
+        return self._container(key, "{", "}")
+
+    def array(self, key: Optional[str] = None) -> ContextManager[None]:
+        return self._container(key, "[", "]")
+
+
+@contextmanager
+def map_jobs(
+    func: Callable[[K], V], items: Iterable[K], jobs: int = 1, chunksize: int = 1
+) -> Generator[Iterator[V], None, None]:
+    """
+    Like `map`, but spreads the calls across `jobs` worker processes if `jobs` is
+    more than 1. Results are in the same order as `items`, so output doesn't
+    depend on the number of jobs.
+
+    ```py
+    with map_jobs(func, items, jobs) as results:
+        for result in results:
+            ...
+    ```
+
+    The worker processes are shut down when the `with` block exits, even if it
+    stops reading results early or raises an exception. Otherwise, a pool left
+    open by an abandoned iterator can keep the program from exiting.
+
+    `func` must be a top-level function so it can be sent to the workers. On
+    Linux, workers are forked, so they start with whatever plans and prereqs
+    the main process has already parsed.
+    """
+    if jobs <= 1:
+        yield map(func, items)
+        return
+    pool = multiprocessing.Pool(jobs)
+    try:
+        yield pool.imap(func, items, chunksize)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 def float_str(num: float) -> str:
     """
     Displays a float as a string. Casts int to a float before string-ifying.